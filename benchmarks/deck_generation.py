@@ -0,0 +1,289 @@
+"""
+Benchmark of the deck generation at increasing roster sizes.
+
+For each deck type and roster size, a synthetic roster is generated (with placeholder logos and photos) and the decks
+are built in a fresh process, timing each stage separately:
+- template_load: `Deck.__init__`, i.e. getting a presentation from the template cache;
+- slide_creation: the `slides` property, i.e. adding the slides from the layouts;
+- fill: `Deck.fill()`, image insertion included;
+- image_insertion: the part of `fill` spent in `insert_image_in_shape` (image preprocessing included, cold cache);
+- save: `Deck.save`, i.e. serialising and writing the .pptx.
+
+Flyers are per member, so N flyers are built for a roster of N members. Community and core team decks hold the whole
+roster, so a single deck is built.
+
+The results are written to a JSON report. Passing a previous report with `--baseline` fails the run when throughput
+or peak memory regress by more than `--tolerance`, and shows how the save time and output size changed, e.g. to
+measure the trade-off of `--fast-save` (media stored as they are) or of another `--xml-compression-level`.
+
+Usage:
+    python benchmarks/deck_generation.py [--sizes 10 100 1000 5000] [--decks flyer community core-team]
+        [--fast-save] [--xml-compression-level 0-9]
+        [--output benchmark-report.json] [--baseline previous-report.json] [--tolerance 0.2]
+"""
+
+import argparse
+import json
+import multiprocessing
+import platform
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+DEFAULT_SIZES = (10, 100, 1000, 5000)
+DECKS = ("flyer", "community", "core-team")
+STAGES = ("template_load", "slide_creation", "fill", "image_insertion", "save")
+
+
+def make_images(directory: Path, count: int):
+    """Generate `count` distinct logos and photos, reused cyclically across the roster."""
+    from PIL import Image, ImageDraw
+
+    logos, photos = [], []
+    for i in range(count):
+        color = ((37 * i) % 256, (91 * i) % 256, (173 * i) % 256)
+        logo = Image.new("RGBA", (1200, 400), color + (255,))
+        ImageDraw.Draw(logo).text((50, 150), f"Company {i}", fill=(255, 255, 255, 255))
+        logos.append(directory / f"logo_{i}.png")
+        logo.save(logos[-1])
+
+        photo = Image.new("RGB", (1500, 2000), color)
+        ImageDraw.Draw(photo).ellipse((300, 300, 1200, 1400), fill=(240, 200, 170))
+        photos.append(directory / f"photo_{i}.jpg")
+        photo.save(photos[-1], quality=90)
+    return logos, photos
+
+
+def make_roster(deck: str, size: int, logos, photos):
+    from positive_ai.documentation.data_model import (
+        AllCoreTeamMembersInfo,
+        AllMembersInfo,
+        MemberInfo,
+    )
+
+    if deck == "core-team":
+        return AllCoreTeamMembersInfo(
+            all_members_info=[
+                dict(
+                    ct_member_firstname=f"First{i}",
+                    ct_member_lastname=f"Last{i}",
+                    ct_member_title_fr="Responsable",
+                    ct_member_title_en="Lead",
+                    ct_member_email=f"member{i}@example.com",
+                    ct_member_photo_path=str(photos[i % len(photos)]),
+                    ct_member_is_board=i % 5 == 0,
+                )
+                for i in range(size)
+            ]
+        )
+    members = [
+        MemberInfo(
+            member_name=f"Company {i}",
+            member_join_month="September 2024",
+            member_logo_path=str(logos[i % len(logos)]),
+            member_gatherer_firstname=f"First{i}",
+            member_gatherer_lastname=f"Last{i}",
+            member_gatherer_title_fr="Directeur des données",
+            member_gatherer_title_en="Chief data officer",
+            member_gatherer_desc_fr="Référent Positive AI",
+            member_gatherer_desc_en="Positive AI gatherer",
+            member_gatherer_email=f"gatherer{i}@example.com",
+            member_gatherer_photo_path=str(photos[i % len(photos)]),
+        )
+        for i in range(size)
+    ]
+    return members if deck == "flyer" else AllMembersInfo(all_members_info=members)
+
+
+def run_case(
+    deck: str,
+    size: int,
+    distinct_images: int,
+    image_dpi: int,
+    fast_save: bool = False,
+    xml_compression_level: int = None,
+) -> dict:
+    """Benchmark one deck type at one roster size. Meant to run in a fresh process."""
+    from positive_ai.documentation import community_deck, core_team_deck, employee_flyer
+    from positive_ai.documentation.batch import FLYER_TEMPLATES, ROSTER_DECK_TEMPLATE
+    from positive_ai.utils.compression import PACKAGE_COMPRESSION
+    from positive_ai.utils.images import IMAGE_PREPROCESSOR
+    from positive_ai.utils import ppt
+
+    PACKAGE_COMPRESSION.configure(fast=fast_save, xml_level=xml_compression_level)
+
+    timings = dict.fromkeys(STAGES, 0.0)
+
+    # time image insertion from within the fill methods
+    def timed(insert):
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return insert(*args, **kwargs)
+            finally:
+                timings["image_insertion"] += time.perf_counter() - start
+
+        return wrapper
+
+    # flyers insert their images through the generic fill of `ppt`
+    for module in (ppt, community_deck, core_team_deck):
+        module.insert_image_in_shape = timed(module.insert_image_in_shape)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        IMAGE_PREPROCESSOR.configure(dpi=image_dpi, cache_dir=tmp / "cache")
+        logos, photos = make_images(tmp, min(size, distinct_images))
+        roster = make_roster(deck, size, logos, photos)
+
+        if deck == "flyer":
+            builds = [
+                (employee_flyer.MemberOnboardingDeck, FLYER_TEMPLATES["fr"], infos)
+                for infos in roster
+            ]
+        elif deck == "community":
+            builds = [(community_deck.CommunityDeck, ROSTER_DECK_TEMPLATE, roster)]
+        else:
+            builds = [(core_team_deck.CoreTeamDeck, ROSTER_DECK_TEMPLATE, roster)]
+
+        slides, output_bytes = 0, 0
+        start_all = time.perf_counter()
+        for i, (deck_cls, template_path, infos) in enumerate(builds):
+            start = time.perf_counter()
+            built = deck_cls(infos=infos, language="fr", template_path=template_path)
+            timings["template_load"] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            slides += len(built.slides)
+            timings["slide_creation"] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            built.fill()
+            timings["fill"] += time.perf_counter() - start
+
+            output = tmp / "out" / f"deck_{i}.pptx"
+            start = time.perf_counter()
+            built.save(file_path=output)
+            timings["save"] += time.perf_counter() - start
+            output_bytes += output.stat().st_size
+            output.unlink()
+        total = time.perf_counter() - start_all
+
+    return {
+        "deck": deck,
+        "members": size,
+        "decks_built": len(builds),
+        "slides": slides,
+        "output_bytes": output_bytes,
+        "timings_s": {stage: round(t, 4) for stage, t in timings.items()},
+        "total_s": round(total, 4),
+        "members_per_s": round(size / total, 2),
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+        "peak_rss_mb": round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            / (1024**2 if sys.platform == "darwin" else 1024),
+            1,
+        ),
+    }
+
+
+def compare(report: dict, baseline: dict, tolerance: float):
+    """List the cases whose throughput or peak memory regressed compared to the baseline."""
+    previous = {(c["deck"], c["members"]): c for c in baseline["cases"]}
+    regressions = []
+    for case in report["cases"]:
+        before = previous.get((case["deck"], case["members"]))
+        if before is None:
+            continue
+        name = f"{case['deck']} x {case['members']}"
+        if case["members_per_s"] < before["members_per_s"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: throughput {before['members_per_s']} -> {case['members_per_s']} members/s"
+            )
+        if case["peak_rss_mb"] > before["peak_rss_mb"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: peak memory {before['peak_rss_mb']} -> {case['peak_rss_mb']} MB"
+            )
+    return regressions
+
+
+def save_trade_offs(report: dict, baseline: dict):
+    """Describe how the save time and output size of each case changed compared to the baseline."""
+    previous = {(c["deck"], c["members"]): c for c in baseline["cases"]}
+    trade_offs = []
+    for case in report["cases"]:
+        before = previous.get((case["deck"], case["members"]))
+        if before is None:
+            continue
+        trade_offs.append(
+            f"{case['deck']} x {case['members']}: save {before['timings_s']['save']:.2f}s -> "
+            f"{case['timings_s']['save']:.2f}s, output {before['output_bytes'] / 1e6:.2f} MB -> "
+            f"{case['output_bytes'] / 1e6:.2f} MB"
+        )
+    return trade_offs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--decks", nargs="+", choices=DECKS, default=list(DECKS))
+    parser.add_argument("--distinct-images", type=int, default=50)
+    parser.add_argument("--image-dpi", type=int, default=150)
+    parser.add_argument("--fast-save", action="store_true")
+    parser.add_argument("--xml-compression-level", type=int, choices=range(10))
+    parser.add_argument("--output", type=Path, default=Path("benchmark-report.json"))
+    parser.add_argument("--baseline", type=Path)
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    from positive_ai import __version__
+
+    report = {
+        "version": __version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "fast_save": args.fast_save,
+        "xml_compression_level": args.xml_compression_level,
+        "cases": [],
+    }
+    # one fresh process per case, so that caches and peak memory do not leak between cases
+    context = multiprocessing.get_context("spawn")
+    for deck in args.decks:
+        for size in args.sizes:
+            with context.Pool(1) as pool:
+                case = pool.apply(
+                    run_case,
+                    (
+                        deck,
+                        size,
+                        args.distinct_images,
+                        args.image_dpi,
+                        args.fast_save,
+                        args.xml_compression_level,
+                    ),
+                )
+            report["cases"].append(case)
+            stages = ", ".join(f"{k}={v:.2f}s" for k, v in case["timings_s"].items())
+            print(
+                f"[+] {deck} x {size}: {case['total_s']:.2f}s ({case['members_per_s']} members/s, "
+                f"{case['peak_rss_mb']} MB, output {case['output_bytes'] / 1e6:.2f} MB) {stages}"
+            )
+
+    args.output.write_text(json.dumps(report, indent=2))
+    print(f"[+] Report written to {args.output}")
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())
+        for trade_off in save_trade_offs(report, baseline):
+            print(f"[+] Save: {trade_off}")
+        regressions = compare(report, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"[-] Regression: {regression}")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Import-time budget check for the CLI cold start.
+
+Imports the CLI entry points in a fresh interpreter with `python -X importtime` and fails when:
+- one of the heavy dependencies (python-pptx, pydantic, PyYAML, etc.) is imported just to build the CLI;
+- the cumulative import time of the entry points is over budget (best of several runs, to smooth out noise).
+
+Usage:
+    python benchmarks/import_time.py [--budget-ms 100] [--runs 5]
+"""
+
+import argparse
+import subprocess
+import sys
+
+ENTRY_MODULES = (
+    "positive_ai.cli",
+    "positive_ai.documentation.cli",
+    "positive_ai.email.cli",
+    "positive_ai.server.cli",
+)
+HEAVY_MODULES = (
+    "pptx",
+    "lxml",
+    "PIL",
+    "pydantic",
+    "email_validator",
+    "yaml",
+    "googletrans",
+)
+DEFAULT_BUDGET_MS = 100
+
+
+def measure():
+    """
+    Returns:
+        cumulative_ms: the time spent importing the entry points, in milliseconds
+        modules: the names of all the modules imported on the way
+    """
+    process = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            f"import {', '.join(ENTRY_MODULES)}",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    cumulative_us, modules = 0, set()
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        if not cumulative.strip().isdigit():
+            continue  # header line
+        modules.add(name.strip())
+        # top level imports are not indented, their cumulative time includes their own imports (interpreter
+        # start-up modules such as `site` are left out)
+        if not name[1:].startswith(" ") and name.strip().startswith("positive_ai"):
+            cumulative_us += int(cumulative)
+    return cumulative_us / 1000, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    # the first run warms the bytecode cache
+    measure()
+    timings, modules = [], set()
+    for _ in range(args.runs):
+        cumulative_ms, modules = measure()
+        timings.append(cumulative_ms)
+    best_ms = min(timings)
+
+    heavy = sorted(
+        m for m in modules if m.split(".")[0] in HEAVY_MODULES and "." not in m
+    )
+    print(f"[+] CLI import time: {best_ms:.1f} ms (budget {args.budget_ms:.0f} ms)")
+    failed = False
+    if heavy:
+        print(f"[-] Heavy modules imported at CLI start-up: {', '.join(heavy)}")
+        failed = True
+    if best_ms > args.budget_ms:
+        print("[-] CLI import time is over budget")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
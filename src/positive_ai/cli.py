@@ -1,42 +1,56 @@
 # -*- coding: utf-8 -*-
-""" CLI helper """
+"""CLI helper"""
 
-import os
+import importlib
 
 import click
 
-from positive_ai.constants import SRC_DIR
+# Registry of the sub-commands: name -> (module defining a `cli` command, short help).
+# The short help is kept here so that `--help` does not have to import every sub-command.
+COMMANDS = {
+    "documentation": (
+        "positive_ai.documentation.cli",
+        "Generates all the automatic documentation in english and french",
+    ),
+    "email": ("positive_ai.email.cli", "All template emails to onboard new members"),
+    "serve": (
+        "positive_ai.server.cli",
+        "Run a local server generating flyers on demand",
+    ),
+}
 
 
 class CLI(click.MultiCommand):
-
     """
-    Define the CLI commands by lookup inside the subdirectories.
+    Define the CLI commands from the registry, importing each of them only when it is invoked.
     """
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._loaded = {}
+
     def list_commands(self, ctx):
-        """list commands from cli.py files in subdirectories"""
-        plugins = []
-        for dir_name in os.listdir(SRC_DIR):
-            dir_path = SRC_DIR / dir_name
-            if os.path.isdir(dir_path):
-                for filename in os.listdir(dir_path):
-                    if filename == "cli.py":
-                        plugins.append(os.path.basename(dir_path))
-        plugins.sort()
-        return plugins
+        """list registered commands"""
+        return sorted(COMMANDS)
 
     def get_command(self, ctx, cmd_name):
-        """get command from subdirectory"""
-        commands = {}  # type: ignore
-        filename = SRC_DIR / cmd_name / "cli.py"
-        try:
-            with open(filename) as file:
-                code = compile(file.read(), filename, "exec")
-                eval(code, commands, commands)  # pylint: disable=eval-used
-            return commands["cli"]
-        except Exception as e:
-            raise e
+        """get command from its module, imported on first use"""
+        if cmd_name not in COMMANDS:
+            return None
+        if cmd_name not in self._loaded:
+            module_name, _ = COMMANDS[cmd_name]
+            self._loaded[cmd_name] = importlib.import_module(module_name).cli
+        return self._loaded[cmd_name]
+
+    def format_commands(self, ctx, formatter):
+        """list the commands with their registered help, without importing them"""
+        limit = formatter.width - 6 - max(len(name) for name in COMMANDS)
+        rows = [
+            (name, click.utils.make_default_short_help(short_help, limit))
+            for name, (_, short_help) in sorted(COMMANDS.items())
+        ]
+        with formatter.section("Commands"):
+            formatter.write_dl(rows)
 
 
 @click.command(cls=CLI)
@@ -1,4 +1,11 @@
+import os
 from pathlib import Path
 
 SRC_DIR = Path(__file__).parent
 ROOT_DIR = SRC_DIR.parent.parent
+CACHE_DIR = Path(
+    os.environ.get(
+        "POSITIVE_AI_CACHE_DIR",
+        Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "positive_ai",
+    )
+)
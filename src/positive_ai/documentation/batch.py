@@ -0,0 +1,586 @@
+import hashlib
+import os
+import traceback
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from functools import partial
+from pathlib import Path
+from typing import (
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    Union,
+)
+
+from positive_ai.constants import SRC_DIR
+from positive_ai.documentation.data_model import MemberInfo
+from positive_ai.documentation.employee_flyer import MemberOnboardingDeck
+from positive_ai.utils.compression import PACKAGE_COMPRESSION
+from positive_ai.utils.images import IMAGE_PREPROCESSOR
+from positive_ai.utils.manifest import BuildManifest, RunJournal, hash_inputs
+from positive_ai.utils.output import DirectorySink, MemorySink, OutputSink
+from positive_ai.utils.pipeline import pipeline
+from positive_ai.utils.ppt import Deck
+from positive_ai.utils.profiling import PROFILER
+from positive_ai.utils.reproducible import BUILD_CLOCK
+
+LANGUAGES = {"fr": "french", "en": "english"}
+
+FLYER_TEMPLATES = {
+    "fr": SRC_DIR / "templates" / "2024_09_pai_members_flyer_template_fr.pptx",
+    "en": SRC_DIR / "templates" / "2024_09_pai_members_flyer_template-en.pptx",
+}
+ROSTER_DECK_TEMPLATE = SRC_DIR / "templates" / "pai_slide_master.pptx"
+
+# how flyers are built: through the python-pptx object model, or directly at the XML level (see
+# `positive_ai.utils.ppt_xml`), which is much faster and gives the same parts
+FLYER_ENGINES = ("pptx", "xml")
+
+FLYER_FIELDS = (
+    "member_name",
+    "member_logo_path",
+    "member_join_month",
+    "member_gatherer_firstname",
+    "member_gatherer_lastname",
+    "member_gatherer_email",
+    "member_gatherer_photo_path",
+)
+
+
+def output_dir() -> Path:
+    """The root directory of everything generated, relative to where the command is run."""
+    return Path.cwd() / "positive_ai-generated"
+
+
+@dataclass
+class MemberResult:
+    """
+    The outcome of the flyer generation for one member of a batch.
+    """
+
+    member_name: str
+    outputs: List[str] = field(default_factory=list)
+    skipped: int = 0
+    error: Optional[str] = None
+    # the sha256 of each output, in the order of `outputs`, when the run is journaled
+    hashes: List[str] = field(default_factory=list)
+    # whether the member was done in a previous run, according to the run journal
+    resumed: bool = False
+    # flyers built in a worker process that cannot write to the sink, for the main process to write
+    files: List[Tuple[str, bytes]] = field(default_factory=list)
+    # profiling events recorded in a worker process
+    profile: List[Dict] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def flyer_member_info(member_config: Dict) -> MemberInfo:
+    """
+    Build the member info used by the flyers, normalising names and email the same way the prompt does.
+    """
+    infos = {k: v for k, v in member_config.items() if k in FLYER_FIELDS}
+    for key in ("member_gatherer_firstname", "member_gatherer_lastname"):
+        if isinstance(infos.get(key), str):
+            infos[key] = infos[key].capitalize()
+    if isinstance(infos.get("member_gatherer_email"), str):
+        infos["member_gatherer_email"] = infos["member_gatherer_email"].lower()
+    return MemberInfo(**infos)
+
+
+def flyer_inputs_hash(infos: MemberInfo, language: str) -> str:
+    return hash_inputs(
+        records=[infos],
+        template_path=FLYER_TEMPLATES[language],
+        image_paths=[infos.member_logo_path, infos.member_gatherer_photo_path],
+        language=language,
+        image_dpi=IMAGE_PREPROCESSOR.dpi,
+        build_date=BUILD_CLOCK.build_date,
+        # unset by default, so that the decks saved the way python-pptx does stay up to date
+        compression=None if PACKAGE_COMPRESSION.default else PACKAGE_COMPRESSION.key,
+    )
+
+
+def generate_flyers(
+    infos: MemberInfo,
+    ts: str,
+    languages: Sequence[str] = tuple(LANGUAGES),
+    verbose: bool = True,
+    engine: str = "pptx",
+    sink: OutputSink = None,
+    jobs: int = 1,
+) -> List[str]:
+    """
+    Build and save the flyers of one member, in french and english by default, with one of `FLYER_ENGINES`.
+
+    With several `jobs`, the languages are built at the same time in worker processes (see `render_variants`).
+
+    Returns:
+        outputs: where the decks were written (by default, files under `output_dir()`), in the order of `languages`
+    """
+    if sink is None:
+        sink = DirectorySink(output_dir())
+    outputs = []
+    variants = [(infos, language, engine) for language in languages]
+    # the decks are rendered as they are pulled, so that each message comes before the rendering of its deck
+    contents = render_variants(_render_flyer, variants, jobs)
+    for language in languages:
+        if verbose:
+            print(f"[+] Generating {LANGUAGES[language]} doc...")
+        outputs.append(sink.write(flyer_path(infos, ts, language), next(contents)))
+    return outputs
+
+
+def flyer_path(infos: MemberInfo, ts: str, language: str) -> Path:
+    """Where a flyer goes, relative to the output root."""
+    filename = f"{ts}_Positive_AI_Flyer_{infos.member_id}_{language}.pptx"
+    return Path("member-specific") / infos.member_id / "employee-onboarding" / filename
+
+
+def _fill_flyer(infos: MemberInfo, language: str, engine: str):
+    """Build a flyer without serialising it yet: a deck whose `to_bytes` gives the content of the file."""
+    if engine == "xml":
+        from positive_ai.utils.ppt_xml import XmlTemplate
+
+        template = XmlTemplate.load(
+            MemberOnboardingDeck, FLYER_TEMPLATES[language], language
+        )
+        return template.fill(infos)
+    deck = MemberOnboardingDeck(
+        template_path=FLYER_TEMPLATES[language], infos=infos, language=language
+    )
+    deck.fill()
+    return deck
+
+
+def _render_flyer(infos: MemberInfo, language: str, engine: str) -> bytes:
+    return _fill_flyer(infos, language, engine).to_bytes()
+
+
+def render_variants(
+    render: Callable[..., bytes], variants: Sequence[Tuple], jobs: int = 1
+) -> Iterator[bytes]:
+    """
+    Render the variants of a deck, e.g. one per language.
+
+    By default, the variants are rendered one after the other and share the images they embed (see
+    `ImagePreprocessor.session`). With several jobs, they are rendered in worker processes, at most one per variant and
+    CPU. Each worker starts afresh and prepares the images again, which only pays off for heavy decks on a multi-core
+    machine. Either way, the decks are yielded in the order of the variants, so what the caller prints and writes does
+    not depend on which variant finishes first.
+
+    Args:
+        render: a module level function building a deck, returning its content
+        variants: the arguments of `render` for each variant
+        jobs: the number of worker processes rendering the variants at the same time, 1 to render them in this process
+    """
+    jobs = min(jobs, len(variants), available_cpus())
+    if jobs < 2:
+        with IMAGE_PREPROCESSOR.session():
+            for args in variants:
+                yield render(*args)
+        return
+
+    with worker_pool(jobs) as executor:
+        futures = [
+            executor.submit(_render_in_worker, render, args) for args in variants
+        ]
+        for future in futures:
+            content, profile = future.result()
+            PROFILER.extend(profile)
+            yield content
+
+
+def _render_in_worker(render: Callable[..., bytes], args: Tuple):
+    """Worker entry point: render a variant and send back the profiling events recorded meanwhile."""
+    content = render(*args)
+    return content, PROFILER.drain() if PROFILER.enabled else []
+
+
+def available_cpus() -> int:
+    """The number of CPUs this process may run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def worker_pool(jobs: int) -> ProcessPoolExecutor:
+    """
+    A pool of worker processes applying the settings of the main process (resolution, cache, profiling, date,
+    compression).
+    """
+    return ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=_init_worker,
+        initargs=(
+            IMAGE_PREPROCESSOR.dpi,
+            IMAGE_PREPROCESSOR.cache_dir,
+            PROFILER.enabled,
+            BUILD_CLOCK.build_date,
+            PACKAGE_COMPRESSION.key,
+        ),
+    )
+
+
+def _format_error(e: Exception) -> str:
+    return "".join(traceback.format_exception_only(type(e), e)).strip()
+
+
+def _init_worker(
+    image_dpi: int,
+    image_cache_dir: Path,
+    profile: bool,
+    build_date: Optional[datetime],
+    compression: Tuple[bool, Optional[int]],
+):
+    """Apply the settings of the main process to a worker process."""
+    IMAGE_PREPROCESSOR.configure(dpi=image_dpi, cache_dir=image_cache_dir)
+    BUILD_CLOCK.configure(build_date)
+    PACKAGE_COMPRESSION.configure(*compression)
+    if profile:
+        PROFILER.enable()
+
+
+def _generate_member(
+    infos: MemberInfo,
+    ts: str,
+    languages: List[str],
+    engine: str,
+    sink: Optional[OutputSink],
+    hash_outputs: bool,
+    in_worker: bool = False,
+) -> MemberResult:
+    """
+    Worker entry point: never raises so that one bad member cannot abort the batch. Without a sink, the flyers are
+    kept in memory and returned to the main process.
+    """
+    memory = MemorySink() if sink is None else None
+    target = sink if sink is not None else memory
+    if hash_outputs:
+        target = _HashingSink(target)
+    try:
+        outputs = generate_flyers(
+            infos, ts, languages=languages, verbose=False, engine=engine, sink=target
+        )
+        result = MemberResult(infos.member_name, outputs=outputs)
+        if hash_outputs:
+            result.hashes = target.hashes
+        if memory is not None:
+            result.files = memory.files
+    except Exception as e:
+        result = MemberResult(infos.member_name, error=_format_error(e))
+    if in_worker and PROFILER.enabled:
+        result.profile = PROFILER.drain()
+    return result
+
+
+class _HashingSink(OutputSink):
+    """Records the sha256 of the documents written to another sink, for the run journal."""
+
+    def __init__(self, sink: OutputSink):
+        self.sink = sink
+        self.shared = sink.shared
+        self.hashes: List[str] = []
+
+    def write(self, relative_path: Union[str, Path], content: bytes) -> str:
+        self.hashes.append(hashlib.sha256(content).hexdigest())
+        return self.sink.write(relative_path, content)
+
+
+@dataclass
+class _MemberWork(object):
+    """A member going through a batch: its validated record, its outdated flyers and, once known, its result."""
+
+    name: str
+    infos: Optional[MemberInfo] = None
+    # the inputs hash of each flyer
+    digests: Dict[str, str] = field(default_factory=dict)
+    # the languages of the flyers to build
+    stale: List[str] = field(default_factory=list)
+    # the flyers filled but not serialised yet, by relative path (in-process pipeline)
+    decks: List[Tuple[Path, object]] = field(default_factory=list)
+    # the result, once known
+    result: Optional[MemberResult] = None
+    # the pending result of a worker process
+    future: Optional[Future] = None
+
+    @property
+    def member_id(self) -> Optional[str]:
+        return self.infos.member_id if self.infos is not None else None
+
+
+def _plan_member(member_config: Dict, manifest, journal, force) -> _MemberWork:
+    """
+    Validate a member and find its outdated flyers. Hashing the inputs reads the images of the member, which brings
+    them in the page cache before they are embedded.
+    """
+    work = _MemberWork(str(member_config.get("member_name", "<unnamed member>")))
+    try:
+        work.infos = flyer_member_info(member_config)
+        work.digests = {
+            language: flyer_inputs_hash(work.infos, language) for language in LANGUAGES
+        }
+    except Exception as e:
+        work.result = MemberResult(work.name, error=_format_error(e))
+        return work
+
+    if journal is not None and journal.is_done(work.member_id, work.digests):
+        work.result = MemberResult(work.name, resumed=True)
+        return work
+
+    work.stale = [
+        language
+        for language, digest in work.digests.items()
+        if force or not manifest.is_fresh(f"flyer/{work.member_id}/{language}", digest)
+    ]
+    if not work.stale:
+        work.result = MemberResult(work.name)
+    return work
+
+
+def _fill_member(work: _MemberWork, ts: str, engine: str) -> _MemberWork:
+    """Pipeline stage: fill the outdated flyers of a member."""
+    if work.result is None:
+        try:
+            with IMAGE_PREPROCESSOR.session():
+                work.decks = [
+                    (
+                        flyer_path(work.infos, ts, language),
+                        _fill_flyer(work.infos, language, engine),
+                    )
+                    for language in work.stale
+                ]
+        except Exception as e:
+            work.result = MemberResult(work.name, error=_format_error(e))
+    return work
+
+
+def _save_member(
+    work: _MemberWork, sink: OutputSink, hash_outputs: bool
+) -> _MemberWork:
+    """Pipeline stage: serialise and write the filled flyers of a member."""
+    if work.result is None:
+        target = _HashingSink(sink) if hash_outputs else sink
+        try:
+            outputs = [target.write(path, deck.to_bytes()) for path, deck in work.decks]
+        except Exception as e:
+            work.result = MemberResult(work.name, error=_format_error(e))
+        else:
+            work.result = MemberResult(work.name, outputs=outputs)
+            if hash_outputs:
+                work.result.hashes = target.hashes
+        work.decks = []
+    return work
+
+
+def generate_flyers_batch(
+    member_configs: Iterable[Dict],
+    ts: str,
+    jobs: int = 1,
+    manifest: BuildManifest = None,
+    force: bool = False,
+    engine: str = "pptx",
+    sink: OutputSink = None,
+    journal: RunJournal = None,
+) -> Iterator[MemberResult]:
+    """
+    Generate the flyers of every member, spreading them across `jobs` worker processes.
+
+    Members are consumed as a stream, so `member_configs` can be a lazy iterator over a very large roster. Flyers
+    whose inputs did not change since they were last built (according to the manifest) are skipped, unless `force` is
+    set. Results are yielded in the order of the input, failures included. `engine` is one of `FLYER_ENGINES`.
+
+    With a single job, members go through a pipeline of threads (see `positive_ai.utils.pipeline`): the records are
+    validated and their images read, the flyers filled, then serialised and written, each stage working on a different
+    member. With several jobs, each worker process builds whole members.
+
+    The flyers are written to `sink`, files under `output_dir()` by default. Sinks that worker processes cannot write
+    to (e.g. a bundle) get the flyers from the main process.
+
+    With a `journal`, every member is recorded as soon as it is done, and the members a resumed journal records as
+    done are skipped (see `RunJournal`).
+    """
+    if sink is None:
+        sink = DirectorySink(output_dir())
+    if manifest is None:
+        manifest = sink.build_manifest()
+
+    try:
+        if jobs == 1:
+            works = pipeline(
+                member_configs,
+                [
+                    partial(
+                        _plan_member, manifest=manifest, journal=journal, force=force
+                    ),
+                    partial(_fill_member, ts=ts, engine=engine),
+                    partial(_save_member, sink=sink, hash_outputs=journal is not None),
+                ],
+            )
+            for work in works:
+                yield _collect(work, manifest, journal, sink)
+        else:
+            yield from _generate_in_workers(
+                member_configs, ts, jobs, manifest, force, engine, sink, journal
+            )
+    finally:
+        manifest.save()
+
+
+def _generate_in_workers(
+    member_configs, ts, jobs, manifest, force, engine, sink, journal
+) -> Iterator[MemberResult]:
+    hash_outputs = journal is not None
+    # workers write to the sink themselves when they can, otherwise they send the flyers back
+    worker_sink = sink if sink.shared else None
+    with worker_pool(jobs) as executor:
+        # keep a bounded window of members in flight, so that workers are never idle but the roster is still
+        # consumed as a stream
+        window = 2 * jobs
+        pending: Deque[_MemberWork] = deque()
+        for member_config in member_configs:
+            work = _plan_member(member_config, manifest, journal, force)
+            if work.result is None:
+                work.future = executor.submit(
+                    _generate_member,
+                    work.infos,
+                    ts,
+                    work.stale,
+                    engine,
+                    worker_sink,
+                    hash_outputs,
+                    True,
+                )
+            pending.append(work)
+            if len(pending) >= window:
+                yield _collect(pending.popleft(), manifest, journal, sink)
+        while pending:
+            yield _collect(pending.popleft(), manifest, journal, sink)
+
+
+def _collect(work: _MemberWork, manifest, journal, sink) -> MemberResult:
+    """
+    Wait for a member, write the flyers it sent back and record its fresh flyers in the manifest and the journal.
+    """
+    member_id, digests, stale = work.member_id, work.digests, work.stale
+    if work.future is not None:
+        work.result = work.future.result()
+        work.future = None
+    result = work.result
+    # a member gets its result while being planned or processed, or from its worker
+    assert result is not None, f"no result for member '{work.name}'"
+    PROFILER.extend(result.profile)
+    if result.files:
+        try:
+            if journal is not None:
+                result.hashes = [
+                    hashlib.sha256(content).hexdigest() for _, content in result.files
+                ]
+            result.outputs = [
+                sink.write(path, content) for path, content in result.files
+            ]
+        except Exception as e:
+            result.error = _format_error(e)
+        result.files = []
+    if result.resumed:
+        # the manifest of an interrupted run may have missed them
+        built = journal.outputs(member_id)
+        for language, output in built.items():
+            manifest.record(f"flyer/{member_id}/{language}", digests[language], output)
+        result.skipped = len(LANGUAGES)
+        return result
+
+    if result.ok:
+        result.skipped = len(LANGUAGES) - len(stale)
+        for language, output in zip(stale, result.outputs):
+            manifest.record(f"flyer/{member_id}/{language}", digests[language], output)
+    if journal is not None:
+        journal.record(
+            member_id or result.member_name,
+            result.member_name,
+            digests,
+            outputs=dict(zip(stale, zip(result.outputs, result.hashes))),
+            error=result.error,
+        )
+    return result
+
+
+def generate_roster_decks(
+    deck_cls: Type[Deck],
+    infos,
+    image_paths: Iterable[Optional[str]],
+    name: str,
+    ts: str,
+    manifest: BuildManifest = None,
+    force: bool = False,
+    sink: OutputSink = None,
+    jobs: int = 1,
+) -> int:
+    """
+    Build and save the french and english decks presenting a whole roster (community, core team, etc.).
+
+    Args:
+        deck_cls: the deck to build
+        infos: the roster, i.e. a model holding `all_members_info`
+        image_paths: all the images embedded in the decks
+        name: the name of the deck, used in the manifest and the file names
+        ts: the date stamp prefixing the file names
+        manifest: the build manifest, decks built from unchanged inputs are skipped
+        force: rebuild the decks even if their inputs did not change
+        sink: where to write the decks, files under `output_dir()` by default
+        jobs: the number of worker processes building the languages at the same time (see `render_variants`)
+
+    Returns:
+        skipped: the number of up to date decks that were not rebuilt
+    """
+    if sink is None:
+        sink = DirectorySink(output_dir())
+    if manifest is None:
+        manifest = sink.build_manifest()
+    image_paths = list(image_paths)
+
+    skipped = 0
+    stale = {}
+    for language, label in LANGUAGES.items():
+        digest = hash_inputs(
+            records=infos.all_members_info,
+            template_path=ROSTER_DECK_TEMPLATE,
+            image_paths=image_paths,
+            language=language,
+            image_dpi=IMAGE_PREPROCESSOR.dpi,
+            build_date=BUILD_CLOCK.build_date,
+            compression=(
+                None if PACKAGE_COMPRESSION.default else PACKAGE_COMPRESSION.key
+            ),
+        )
+        if not force and manifest.is_fresh(f"{name}/{language}", digest):
+            print(f"[+] The {label} doc is up to date, skipped.")
+            skipped += 1
+        else:
+            stale[language] = digest
+
+    variants = [(deck_cls, infos, language) for language in stale]
+    contents = render_variants(_render_roster_deck, variants, jobs)
+    for language, digest in stale.items():
+        print(f"[+] Generating {LANGUAGES[language]} doc...")
+        content = next(contents)
+        filename = f"{ts}_Positive_AI_{name.title().replace('-', '_')}_{language}.pptx"
+        output = sink.write(Path("non-member-specific") / filename, content)
+        manifest.record(f"{name}/{language}", digest, output)
+        manifest.save()
+    return skipped
+
+
+def _render_roster_deck(deck_cls: Type[Deck], infos, language: str) -> bytes:
+    deck = deck_cls(template_path=ROSTER_DECK_TEMPLATE, infos=infos, language=language)
+    return deck.to_bytes()
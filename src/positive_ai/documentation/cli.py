@@ -1,27 +1,84 @@
-import datetime
 from pathlib import Path
 import click
-import yaml
 
 from positive_ai.constants import SRC_DIR
-from positive_ai.documentation.core_team_deck import CoreTeamDeck
-from positive_ai.documentation.employee_flyer import MemberOnboardingDeck
-from positive_ai.documentation.community_deck import CommunityDeck
-from positive_ai.documentation.data_model import (
-    MemberInfo,
-    AllMembersInfo,
-    AllCoreTeamMembersInfo,
-    BaseMemberInfo,
-)
-from positive_ai.documentation.referent_starter_pack import ReferentStarterPack
 from positive_ai.utils.click import SpecialHelpOrder
-from positive_ai.utils.io import read_yaml
+from positive_ai.utils.compression import PACKAGE_COMPRESSION
+from positive_ai.utils.images import DEFAULT_IMAGE_DPI, IMAGE_PREPROCESSOR
+from positive_ai.utils.io import iter_records
+from positive_ai.utils.profiling import PROFILER
+from positive_ai.utils.reproducible import BUILD_CLOCK, SOURCE_DATE_EPOCH
 
 
 @click.group(cls=SpecialHelpOrder)
-def cli():
+@click.option(
+    "--image-dpi",
+    help="resolution at which logos and photos are downsized before embedding (0 keeps the originals)",
+    type=click.IntRange(min=0),
+    default=DEFAULT_IMAGE_DPI,
+    show_default=True,
+)
+@click.option(
+    "--profile",
+    help="time each generation stage and print a summary at the end",
+    is_flag=True,
+)
+@click.option(
+    "--profile-output",
+    help="also write the per deck / per slide timings as a JSON trace (Chrome trace event format)",
+    type=click.Path(dir_okay=False, writable=True),
+)
+@click.option(
+    "--build-date",
+    help=(
+        "date stamped in the outputs instead of today, making them byte-reproducible "
+        f"(defaults to ${SOURCE_DATE_EPOCH} when set)"
+    ),
+    type=click.DateTime(formats=["%Y-%m-%d"]),
+)
+@click.option(
+    "--fast-save",
+    help=(
+        "store the already compressed media of the decks as they are and deflate the XML parts at a low level: "
+        "faster saves, bigger files"
+    ),
+    is_flag=True,
+)
+@click.option(
+    "--xml-compression-level",
+    help=(
+        "deflate level of the XML parts of the decks, from 0 (fastest) to 9 (smallest) "
+        "[default: 1 with --fast-save, 6 otherwise]"
+    ),
+    type=click.IntRange(min=0, max=9),
+)
+@click.pass_context
+def cli(
+    ctx,
+    image_dpi,
+    profile,
+    profile_output,
+    build_date,
+    fast_save,
+    xml_compression_level,
+):
     """Generates all the automatic documentation in english and french"""
-    pass
+    IMAGE_PREPROCESSOR.configure(dpi=image_dpi)
+    PACKAGE_COMPRESSION.configure(fast=fast_save, xml_level=xml_compression_level)
+    try:
+        BUILD_CLOCK.configure(build_date or BUILD_CLOCK.date_from_environment())
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--build-date")
+    if profile or profile_output:
+        PROFILER.enable()
+        ctx.call_on_close(lambda: _report_profile(profile_output))
+
+
+def _report_profile(profile_output):
+    print(PROFILER.summary())
+    if profile_output:
+        PROFILER.write_trace(profile_output)
+        print(f"[+] Profiling trace written to {profile_output}")
 
 
 @cli.command(
@@ -35,7 +92,10 @@ def cli():
     prompt="Please provide the full name of the company joining Positive AI",
 )
 def generate_starter_pack(member_name):
-    ts = datetime.datetime.now().strftime("%Y_%m_%d")
+    from positive_ai.documentation.data_model import BaseMemberInfo
+    from positive_ai.documentation.referent_starter_pack import ReferentStarterPack
+
+    ts = BUILD_CLOCK.now().strftime("%Y_%m_%d")
     infos = BaseMemberInfo(member_name=member_name)
 
     # Build english deck
@@ -117,6 +177,23 @@ def generate_starter_pack(member_name):
     type=str,
     prompt="Please provide the path to the professional photo of the company referent",
 )
+@click.option(
+    "--engine",
+    help="how to build the flyers: with python-pptx, or directly at the XML level (faster)",
+    type=click.Choice(["pptx", "xml"]),
+    default="pptx",
+    show_default=True,
+)
+@click.option(
+    "--jobs",
+    help=(
+        "number of worker processes building the french and english decks in parallel; "
+        "only worth it for large decks on a multi-core machine"
+    ),
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+)
 def generate_one_flyer(
     member_name,
     member_logo_path,
@@ -125,56 +202,27 @@ def generate_one_flyer(
     member_gatherer_lastname,
     member_gatherer_email,
     member_gatherer_photo_path,
+    engine,
+    jobs,
 ):
-    ts = datetime.datetime.now().strftime("%Y_%m_%d")
+    from positive_ai.documentation.batch import flyer_member_info, generate_flyers
+
+    ts = BUILD_CLOCK.now().strftime("%Y_%m_%d")
 
     # Summarise member info from prompt
-    infos = MemberInfo(
-        member_name=member_name,
-        member_logo_path=member_logo_path,
-        member_join_month=member_join_month,
-        member_gatherer_firstname=member_gatherer_firstname.capitalize(),
-        member_gatherer_lastname=member_gatherer_lastname.capitalize(),
-        member_gatherer_email=member_gatherer_email.lower(),
-        member_gatherer_photo_path=member_gatherer_photo_path,
+    infos = flyer_member_info(
+        dict(
+            member_name=member_name,
+            member_logo_path=member_logo_path,
+            member_join_month=member_join_month,
+            member_gatherer_firstname=member_gatherer_firstname,
+            member_gatherer_lastname=member_gatherer_lastname,
+            member_gatherer_email=member_gatherer_email,
+            member_gatherer_photo_path=member_gatherer_photo_path,
+        )
     )
     print(f"[+] Generating doc for member '{infos.member_name}'")
-
-    # Build french deck
-    print("[+] Generating french doc...")
-    fr_template_path = (
-        SRC_DIR / "templates" / "2024_09_pai_members_flyer_template_fr.pptx"
-    )
-    french_deck = MemberOnboardingDeck(
-        template_path=fr_template_path, infos=infos, language="fr"
-    )
-    filename = f"{ts}_Positive_AI_Flyer_{infos.member_id}_fr.pptx"
-    french_deck.save(
-        file_path=Path.cwd()
-        / "positive_ai-generated"
-        / "member-specific"
-        / infos.member_id
-        / "employee-onboarding"
-        / filename
-    )
-
-    # Build english deck
-    print("[+] Generating english doc...")
-    en_template_path = (
-        SRC_DIR / "templates" / "2024_09_pai_members_flyer_template-en.pptx"
-    )
-    english_deck = MemberOnboardingDeck(
-        template_path=en_template_path, infos=infos, language="en"
-    )
-    filename = f"{ts}_Positive_AI_Flyer_{infos.member_id}_en.pptx"
-    english_deck.save(
-        file_path=Path.cwd()
-        / "positive_ai-generated"
-        / "member-specific"
-        / infos.member_id
-        / "employee-onboarding"
-        / filename
-    )
+    generate_flyers(infos, ts, engine=engine, jobs=jobs)
 
     print("[+] Done.")
 
@@ -185,26 +233,108 @@ def generate_one_flyer(
 )
 @click.option(
     "--config-file-path",
-    help="configuration file holding all necessary information about joining members",
+    help="configuration file holding all necessary information about joining members (YAML or JSON Lines)",
     type=str,
     prompt=True,
 )
-def generate_all_flyers(config_file_path):
-    print("[+] Starting batch flyer generation...")
-    with open(config_file_path) as stream:
+@click.option(
+    "--jobs",
+    help="number of worker processes generating flyers in parallel",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+)
+@click.option(
+    "--force",
+    help="rebuild every output, even those whose inputs did not change since the last run",
+    is_flag=True,
+)
+@click.option(
+    "--engine",
+    help="how to build the flyers: with python-pptx, or directly at the XML level (faster)",
+    type=click.Choice(["pptx", "xml"]),
+    default="pptx",
+    show_default=True,
+)
+@click.option(
+    "--bundle",
+    help=(
+        "write all the outputs into this zip archive (with a manifest) instead of separate files; "
+        "everything is rebuilt"
+    ),
+    type=click.Path(dir_okay=False),
+)
+@click.option(
+    "--resume",
+    help="skip the members a previous (interrupted or failed) run already built, according to its journal",
+    is_flag=True,
+)
+@click.option(
+    "--validate-first",
+    help="validate the whole roster and check its images before generating anything, reporting every error",
+    is_flag=True,
+)
+def generate_all_flyers(
+    config_file_path, jobs, force, engine, bundle, resume, validate_first
+):
+    from positive_ai.documentation.batch import generate_flyers_batch
+    from positive_ai.documentation.data_model import MemberInfo
+
+    if resume and bundle:
+        raise click.UsageError("--resume cannot be used with --bundle")
+
+    if validate_first:
+        members = _validate_roster(config_file_path, MemberInfo)
+        print(f"[+] {len(members)} member(s) validated.")
+
+    ts = BUILD_CLOCK.now().strftime("%Y_%m_%d")
+    print(f"[+] Starting batch flyer generation with {jobs} job(s)...")
+    failures = []
+    skipped = total = 0
+    with _open_sink(bundle) as sink:
+        journal = sink.run_journal(resume=resume)
         try:
-            loaded = yaml.safe_load(stream)
-            for member_config in loaded:
-                try:
-                    params = [p.name for p in generate_one_flyer.params]
-                    generate_one_flyer.callback(
-                        **{k: v for k, v in member_config.items() if k in params}
+            for result in generate_flyers_batch(
+                iter_records(config_file_path),
+                ts,
+                jobs=jobs,
+                force=force,
+                engine=engine,
+                sink=sink,
+                journal=journal,
+            ):
+                total += 1
+                skipped += result.skipped
+                if not result.ok:
+                    print(f"[-] {result.member_name}: FAILED ({result.error})")
+                    failures.append(result)
+                elif result.resumed:
+                    print(f"[+] {result.member_name}: done in a previous run")
+                elif result.outputs:
+                    print(
+                        f"[+] {result.member_name}: {len(result.outputs)} flyer(s) generated"
                     )
-                except Exception as e:
-                    raise e
+                else:
+                    print(f"[+] {result.member_name}: up to date")
+        finally:
+            if journal is not None:
+                journal.close()
+    print(f"[+] {skipped} up to date flyer(s) skipped.")
+    if bundle:
+        print(f"[+] Bundle written to {bundle}")
 
-        except yaml.YAMLError as exc:
-            raise exc
+    if failures:
+        # the failure report: every failed member with its error, the others were built anyway
+        print(f"[-] {len(failures)} of {total} member(s) failed:")
+        for result in failures:
+            print(f"    - {result.member_name}: {result.error}")
+        if journal is not None:
+            print(
+                f"[-] Run journal written to {journal.path}, fix the failed members and run again with --resume to"
+                " only build them."
+            )
+        raise click.ClickException(f"{len(failures)} member(s) failed")
+    print("[+] Done.")
 
 
 @cli.command(
@@ -213,40 +343,76 @@ def generate_all_flyers(config_file_path):
 )
 @click.option(
     "--config-file-path",
-    help="configuration file holding all necessary information about joining members",
+    help="configuration file holding all necessary information about joining members (YAML or JSON Lines)",
     type=str,
     prompt=True,
 )
-def generate_community_deck(config_file_path):
-    ts = datetime.datetime.now().strftime("%Y_%m_%d")
-    infos = AllMembersInfo(all_members_info=read_yaml(config_file_path))
+@click.option(
+    "--force",
+    help="rebuild every output, even those whose inputs did not change since the last run",
+    is_flag=True,
+)
+@click.option(
+    "--translate",
+    help=(
+        "fill the missing french / english titles and descriptions, with a translation backend ('google') "
+        "or a glossary file (YAML mapping of text to translation)"
+    ),
+    type=str,
+)
+@click.option(
+    "--bundle",
+    help=(
+        "write all the outputs into this zip archive (with a manifest) instead of separate files; "
+        "everything is rebuilt"
+    ),
+    type=click.Path(dir_okay=False),
+)
+@click.option(
+    "--jobs",
+    help=(
+        "number of worker processes building the french and english decks in parallel; "
+        "only worth it for large decks on a multi-core machine"
+    ),
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+)
+def generate_community_deck(config_file_path, force, translate, bundle, jobs):
+    from positive_ai.documentation.batch import generate_roster_decks
+    from positive_ai.documentation.community_deck import CommunityDeck
+    from positive_ai.documentation.data_model import AllMembersInfo, MemberInfo
 
-    # Build english deck
-    print("[+] Generating french doc...")
-    fr_template_path = SRC_DIR / "templates" / "pai_slide_master.pptx"
-    fr_deck = CommunityDeck(template_path=fr_template_path, infos=infos, language="fr")
-    filename = f"{ts}_Positive_AI_Community_Deck_fr.pptx"
-    fr_deck.save(
-        file_path=Path.cwd()
-        / "positive_ai-generated"
-        / "non-member-specific"
-        / filename
+    ts = BUILD_CLOCK.now().strftime("%Y_%m_%d")
+    infos = AllMembersInfo(
+        all_members_info=_validate_roster(config_file_path, MemberInfo)
     )
+    if translate:
+        _translate_roster(infos, translate)
 
-    print("[+] Generating english doc...")
-    en_template_path = SRC_DIR / "templates" / "pai_slide_master.pptx"
-    english_deck = CommunityDeck(
-        template_path=en_template_path, infos=infos, language="en"
-    )
-    filename = f"{ts}_Positive_AI_Community_Deck_en.pptx"
-    english_deck.save(
-        file_path=Path.cwd()
-        / "positive_ai-generated"
-        / "non-member-specific"
-        / filename
-    )
+    image_paths = [
+        path
+        for member_info in infos.all_members_info
+        for path in (
+            member_info.member_logo_path,
+            member_info.member_gatherer_photo_path,
+        )
+    ]
+    with _open_sink(bundle) as sink:
+        skipped = generate_roster_decks(
+            CommunityDeck,
+            infos,
+            image_paths,
+            "community-deck",
+            ts,
+            force=force,
+            sink=sink,
+            jobs=jobs,
+        )
+    if bundle:
+        print(f"[+] Bundle written to {bundle}")
 
-    print("[+] Done.")
+    print(f"[+] Done ({skipped} up to date doc(s) skipped).")
 
 
 @cli.command(
@@ -255,37 +421,138 @@ def generate_community_deck(config_file_path):
 )
 @click.option(
     "--config-file-path",
-    help="configuration file holding all necessary information about joining members",
+    help="configuration file holding all necessary information about joining members (YAML or JSON Lines)",
     type=str,
     prompt=True,
 )
-def generate_core_team_deck(config_file_path):
-    ts = datetime.datetime.now().strftime("%Y_%m_%d")
-    infos = AllCoreTeamMembersInfo(all_members_info=read_yaml(config_file_path))
-
-    # Build english deck
-    print("[+] Generating french doc...")
-    fr_template_path = SRC_DIR / "templates" / "pai_slide_master.pptx"
-    fr_deck = CoreTeamDeck(template_path=fr_template_path, infos=infos, language="fr")
-    filename = f"{ts}_Positive_AI_Core_Team_Deck_fr.pptx"
-    fr_deck.save(
-        file_path=Path.cwd()
-        / "positive_ai-generated"
-        / "non-member-specific"
-        / filename
+@click.option(
+    "--force",
+    help="rebuild every output, even those whose inputs did not change since the last run",
+    is_flag=True,
+)
+@click.option(
+    "--translate",
+    help=(
+        "fill the missing french / english titles and descriptions, with a translation backend ('google') "
+        "or a glossary file (YAML mapping of text to translation)"
+    ),
+    type=str,
+)
+@click.option(
+    "--bundle",
+    help=(
+        "write all the outputs into this zip archive (with a manifest) instead of separate files; "
+        "everything is rebuilt"
+    ),
+    type=click.Path(dir_okay=False),
+)
+@click.option(
+    "--jobs",
+    help=(
+        "number of worker processes building the french and english decks in parallel; "
+        "only worth it for large decks on a multi-core machine"
+    ),
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+)
+def generate_core_team_deck(config_file_path, force, translate, bundle, jobs):
+    from positive_ai.documentation.batch import generate_roster_decks
+    from positive_ai.documentation.core_team_deck import CoreTeamDeck
+    from positive_ai.documentation.data_model import (
+        AllCoreTeamMembersInfo,
+        CoreTeamMemberInfo,
     )
 
-    print("[+] Generating english doc...")
-    en_template_path = SRC_DIR / "templates" / "pai_slide_master.pptx"
-    english_deck = CoreTeamDeck(
-        template_path=en_template_path, infos=infos, language="en"
+    ts = BUILD_CLOCK.now().strftime("%Y_%m_%d")
+    infos = AllCoreTeamMembersInfo(
+        all_members_info=_validate_roster(config_file_path, CoreTeamMemberInfo)
     )
-    filename = f"{ts}_Positive_AI_Core_Team_Deck_en.pptx"
-    english_deck.save(
-        file_path=Path.cwd()
-        / "positive_ai-generated"
-        / "non-member-specific"
-        / filename
+    if translate:
+        _translate_roster(infos, translate)
+
+    image_paths = [m.ct_member_photo_path for m in infos.all_members_info]
+    with _open_sink(bundle) as sink:
+        skipped = generate_roster_decks(
+            CoreTeamDeck,
+            infos,
+            image_paths,
+            "core-team-deck",
+            ts,
+            force=force,
+            sink=sink,
+            jobs=jobs,
+        )
+    if bundle:
+        print(f"[+] Bundle written to {bundle}")
+
+    print(f"[+] Done ({skipped} up to date doc(s) skipped).")
+
+
+@cli.command(
+    help="Validate a roster file and check its images, reporting every error with its line number.",
+    help_priority=4,
+)
+@click.option(
+    "--config-file-path",
+    help="the roster file to validate (YAML or JSON Lines)",
+    type=str,
+    prompt=True,
+)
+@click.option(
+    "--roster",
+    help="the kind of records the roster holds",
+    type=click.Choice(["members", "core-team"]),
+    default="members",
+    show_default=True,
+)
+def validate_roster(config_file_path, roster):
+    from positive_ai.documentation.data_model import CoreTeamMemberInfo, MemberInfo
+
+    model = MemberInfo if roster == "members" else CoreTeamMemberInfo
+    records = _validate_roster(config_file_path, model)
+    print(f"[+] {len(records)} record(s) valid.")
+
+
+def _validate_roster(config_file_path: str, model):
+    """Validate a whole roster file up front, turning its errors (all of them) into a CLI error."""
+    import yaml
+
+    from positive_ai.utils.validation import RosterValidator
+
+    try:
+        return RosterValidator.for_model(model).validate_file(config_file_path)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    except yaml.YAMLError as e:
+        mark = getattr(e, "problem_mark", None)
+        if mark is None:
+            raise click.ClickException(f"{config_file_path}: invalid YAML: {e}")
+        raise click.ClickException(
+            f"{config_file_path}:{mark.line + 1}:{mark.column + 1}: invalid YAML: {e.problem}"
+        )
+
+
+def _open_sink(bundle: str = None):
+    """Where the outputs go: the given bundle archive, or separate files under the output directory."""
+    from positive_ai.documentation.batch import output_dir
+    from positive_ai.utils.output import DirectorySink, ZipBundleSink
+
+    return ZipBundleSink(Path(bundle)) if bundle else DirectorySink(output_dir())
+
+
+def _translate_roster(infos, backend: str):
+    from positive_ai.utils.translation import (
+        Translator,
+        fill_missing_translations,
+        get_backend,
     )
 
-    print("[+] Done.")
+    print("[+] Translating missing titles and descriptions...")
+    try:
+        translator = Translator(get_backend(backend))
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--translate")
+    infos.all_members_info = fill_missing_translations(
+        infos.all_members_info, translator
+    )
@@ -1,4 +1,3 @@
-from datetime import datetime
 from pathlib import Path
 from typing import List, Optional
 
@@ -10,8 +9,10 @@ from positive_ai.utils.ppt import (
     ExtendedSlide,
     replace_text_in_shape,
     insert_image_in_shape,
+    remove_empty_placeholders,
     Deck,
 )
+from positive_ai.utils.reproducible import BUILD_CLOCK
 
 
 def chunk_list(lst, size):
@@ -23,84 +24,97 @@ class FirstPage(ExtendedSlide):
     A class defining the main page.
     """
 
+    SHAPE_NAMES = {"title": "Title 1", "date": "Subtitle 2"}
+
     def __init__(self, master_slide, infos: MemberInfo, language: str):
         super().__init__(master_slide, language=language)
         self._infos = infos
 
     def fill(self):
-        today = datetime.today().strftime("%b %d, %Y")
-        replace_text_in_shape(self.get_shape("Subtitle 2"), today)
+        shapes = self.get_field_shapes()
+        today = BUILD_CLOCK.now().strftime("%b %d, %Y")
+        replace_text_in_shape(shapes["date"], today)
         if self._language == "fr":
-            replace_text_in_shape(self.get_shape("Title 1"), "Communauté Positive AI")
+            replace_text_in_shape(shapes["title"], "Communauté Positive AI")
         else:
-            replace_text_in_shape(self.get_shape("Title 1"), "Positive AI Community")
+            replace_text_in_shape(shapes["title"], "Positive AI Community")
+
+
+# number of members on a trombi slide
+TROMBI_PAGE_SIZE = 4
 
 
 class TrombiPage(ExtendedSlide):
+    # each member takes 6 consecutive placeholders, after the title
+    SHAPE_NAMES = {
+        "title": "Title 1",
+        **{
+            (i, field): f"{kind} Placeholder {2 + 6 * i + offset}"
+            for i in range(TROMBI_PAGE_SIZE)
+            for offset, (kind, field) in enumerate(
+                [
+                    ("Picture", "logo"),
+                    ("Picture", "photo"),
+                    ("Text", "name"),
+                    ("Text", "title"),
+                    ("Text", "email"),
+                    ("Text", "desc"),
+                ]
+            )
+        },
+    }
+
     def __init__(self, master_slide, infos: List[MemberInfo], language: str):
         super().__init__(master_slide, language=language)
         self._infos = infos
 
     def fill(self):
+        shapes = self.get_field_shapes()
         if self._language == "fr":
             replace_text_in_shape(
-                self.get_shape("Title 1"), "Communauté PAI - Référents Entreprise"
+                shapes["title"], "Communauté PAI - Référents Entreprise"
             )
         else:
-            replace_text_in_shape(
-                self.get_shape("Title 1"), "PAI Community - Gatherers"
-            )
+            replace_text_in_shape(shapes["title"], "PAI Community - Gatherers")
 
-        start_num = 2
         for i, member_info in enumerate(self._infos):
-            shape_num = start_num + 6 * i
             insert_image_in_shape(
-                self.get_shape(f"Picture Placeholder {shape_num}"),
+                shapes[i, "logo"],
                 member_info.member_logo_path,
                 refit=True,
                 center=True,
             )
             insert_image_in_shape(
-                self.get_shape(f"Picture Placeholder {shape_num + 1}"),
+                shapes[i, "photo"],
                 member_info.member_gatherer_photo_path,
                 refit=False,
             )
             replace_text_in_shape(
-                self.get_shape(f"Text Placeholder {shape_num + 2}"),
+                shapes[i, "name"],
                 member_info.member_gatherer_firstname
                 + " "
                 + member_info.member_gatherer_lastname,
             )
             if self._language == "fr":
                 replace_text_in_shape(
-                    self.get_shape(f"Text Placeholder {shape_num + 3}"),
-                    member_info.member_gatherer_title_fr,
+                    shapes[i, "title"], member_info.member_gatherer_title_fr
                 )
             else:
                 replace_text_in_shape(
-                    self.get_shape(f"Text Placeholder {shape_num + 3}"),
-                    member_info.member_gatherer_title_en,
+                    shapes[i, "title"], member_info.member_gatherer_title_en
                 )
-            replace_text_in_shape(
-                self.get_shape(f"Text Placeholder {shape_num + 4}"),
-                member_info.member_gatherer_email,
-            )
+            replace_text_in_shape(shapes[i, "email"], member_info.member_gatherer_email)
             if self._language == "fr":
                 replace_text_in_shape(
-                    self.get_shape(f"Text Placeholder {shape_num + 5}"),
-                    member_info.member_gatherer_desc_fr,
+                    shapes[i, "desc"], member_info.member_gatherer_desc_fr
                 )
             else:
                 replace_text_in_shape(
-                    self.get_shape(f"Text Placeholder {shape_num + 5}"),
-                    member_info.member_gatherer_desc_en,
+                    shapes[i, "desc"], member_info.member_gatherer_desc_en
                 )
 
         # remove remaining placeholders
-        for placeholder in self.shapes.placeholders:
-            if placeholder.has_text_frame and placeholder.text_frame.text == "":
-                sp = placeholder._sp
-                sp.getparent().remove(sp)
+        remove_empty_placeholders(self)
 
 
 class CommunityDeck(Deck):
@@ -120,14 +134,14 @@ class CommunityDeck(Deck):
             slide_list = []
             # First slide
             layout = self.get_layout("Diapositive titre (lapis)")
-            master = self._template_path.slides.add_slide(layout)
+            master = self.add_slide(layout)
             slide_list.append(
                 FirstPage(master, infos=self._infos, language=self._language)
             )
             # create chunks of 4 members because trombi slide can handle only 4 members
-            for chunk in chunk_list(self._infos.all_members_info, 4):
+            for chunk in chunk_list(self._infos.all_members_info, TROMBI_PAGE_SIZE):
                 layout = self.get_layout("facebook-slide-detailed")
-                page = self._template_path.slides.add_slide(layout)
+                page = self.add_slide(layout)
                 slide_list.append(
                     TrombiPage(page, infos=chunk, language=self._language)
                 )
@@ -1,4 +1,3 @@
-from datetime import datetime
 from pathlib import Path
 from typing import List, Optional
 
@@ -10,8 +9,10 @@ from positive_ai.utils.ppt import (
     ExtendedSlide,
     replace_text_in_shape,
     insert_image_in_shape,
+    remove_empty_placeholders,
     Deck,
 )
+from positive_ai.utils.reproducible import BUILD_CLOCK
 
 
 def chunk_list(lst, size):
@@ -23,65 +24,84 @@ class FirstPage(ExtendedSlide):
     A class defining the main page.
     """
 
+    SHAPE_NAMES = {"title": "Title 1", "date": "Subtitle 2"}
+
     def __init__(self, master_slide, infos: MemberInfo, language: str):
         super().__init__(master_slide, language=language)
         self._infos = infos
 
     def fill(self):
-        today = datetime.today().strftime("%b %d, %Y")
-        replace_text_in_shape(self.get_shape("Subtitle 2"), today)
+        shapes = self.get_field_shapes()
+        today = BUILD_CLOCK.now().strftime("%b %d, %Y")
+        replace_text_in_shape(shapes["date"], today)
         if self._language == "fr":
             replace_text_in_shape(
-                self.get_shape("Title 1"),
+                shapes["title"],
                 "Conseil d'administration et Core Team Positive AI",
             )
         else:
-            replace_text_in_shape(
-                self.get_shape("Title 1"), "Positive AI Board and Core Team"
-            )
+            replace_text_in_shape(shapes["title"], "Positive AI Board and Core Team")
+
+
+# number of members on a trombi slide
+TROMBI_PAGE_SIZE = 8
 
 
 class TrombiPage(ExtendedSlide):
+    # each member takes 4 consecutive placeholders, after the title
+    SHAPE_NAMES = {
+        "title": "Title 1",
+        **{
+            (i, field): f"{kind} Placeholder {2 + 4 * i + offset}"
+            for i in range(TROMBI_PAGE_SIZE)
+            for offset, (kind, field) in enumerate(
+                [
+                    ("Picture", "photo"),
+                    ("Text", "name"),
+                    ("Text", "title"),
+                    ("Text", "email"),
+                ]
+            )
+        },
+    }
+
     def __init__(self, master_slide, infos: List[CoreTeamMemberInfo], language: str):
         super().__init__(master_slide, language=language)
         self._infos = infos
 
     def set_title(self, title: str):
-        replace_text_in_shape(self.get_shape("Title 1"), title)
+        replace_text_in_shape(self.get_field_shapes(["title"])["title"], title)
 
     def fill(self):
-        start_num = 1
+        shapes = self.get_field_shapes(
+            [
+                (i, field)
+                for i in range(len(self._infos))
+                for field in ("photo", "name", "title", "email")
+            ]
+        )
         for i, member_info in enumerate(self._infos):
-            shape_num = start_num + 4 * i
             insert_image_in_shape(
-                self.get_shape(f"Picture Placeholder {shape_num + 1}"),
+                shapes[i, "photo"],
                 member_info.ct_member_photo_path,
                 refit=False,
             )
             replace_text_in_shape(
-                self.get_shape(f"Text Placeholder {shape_num + 2}"),
+                shapes[i, "name"],
                 member_info.ct_member_firstname + " " + member_info.ct_member_lastname,
             )
             if self._language == "fr":
                 replace_text_in_shape(
-                    self.get_shape(f"Text Placeholder {shape_num + 3}"),
-                    member_info.ct_member_title_fr,
+                    shapes[i, "title"], member_info.ct_member_title_fr
                 )
             else:
                 replace_text_in_shape(
-                    self.get_shape(f"Text Placeholder {shape_num + 3}"),
-                    member_info.ct_member_title_en,
+                    shapes[i, "title"], member_info.ct_member_title_en
                 )
-            replace_text_in_shape(
-                self.get_shape(f"Text Placeholder {shape_num + 4}"),
-                member_info.ct_member_email,
-            )
+            replace_text_in_shape(shapes[i, "email"], member_info.ct_member_email)
 
         # remove remaining placeholders
-        for placeholder in self.shapes.placeholders:
-            if placeholder.has_text_frame and placeholder.text_frame.text == "":
-                sp = placeholder._sp
-                sp.getparent().remove(sp)
+        remove_empty_placeholders(self)
 
 
 class CoreTeamDeck(Deck):
@@ -101,15 +121,15 @@ class CoreTeamDeck(Deck):
             slide_list = []
             # First slide
             layout = self.get_layout("Diapositive titre (lapis)")
-            master = self._template_path.slides.add_slide(layout)
+            master = self.add_slide(layout)
             slide_list.append(
                 FirstPage(master, infos=self._infos, language=self._language)
             )
             board = [el for el in self._infos.all_members_info if el.ct_member_is_board]
             # create chunks of 8 members because trombi slide can handle only 8 members
-            for chunk in chunk_list(board, 8):
+            for chunk in chunk_list(board, TROMBI_PAGE_SIZE):
                 layout = self.get_layout("facebook-slide-dense")
-                page = self._template_path.slides.add_slide(layout)
+                page = self.add_slide(layout)
                 page = TrombiPage(page, infos=chunk, language=self._language)
                 if self._language == "fr":
                     page.set_title("Conseil d'administration Positive AI")
@@ -121,9 +141,9 @@ class CoreTeamDeck(Deck):
                 el for el in self._infos.all_members_info if not el.ct_member_is_board
             ]
             # create chunks of 8 members because trombi slide can handle only 8 members
-            for chunk in chunk_list(other, 8):
+            for chunk in chunk_list(other, TROMBI_PAGE_SIZE):
                 layout = self.get_layout("facebook-slide-dense")
-                page = self._template_path.slides.add_slide(layout)
+                page = self.add_slide(layout)
                 page = TrombiPage(page, infos=chunk, language=self._language)
                 if self._language == "fr":
                     page.set_title("Core Team Positive AI")
@@ -1,6 +1,5 @@
-from typing import Optional
+from typing import ClassVar, Optional, Tuple
 
-from googletrans import Translator
 from pydantic import BaseModel, EmailStr
 
 
@@ -13,6 +12,11 @@ class CoreTeamMemberInfo(BaseModel):
     ct_member_photo_path: Optional[str] = None
     ct_member_is_board: bool
 
+    # (french field, english field) pairs that can be translated from one another
+    TRANSLATED_FIELDS: ClassVar[Tuple[Tuple[str, str], ...]] = (
+        ("ct_member_title_fr", "ct_member_title_en"),
+    )
+
 
 class BaseMemberInfo(BaseModel):
     member_name: str
@@ -39,10 +43,11 @@ class MemberInfo(BaseModel):
     def member_id(self) -> str:
         return self.member_name.lower().replace(" ", "_")
 
-    # @property
-    # def member_gatherer_desc_en(self) -> str:
-    #     translator = Translator()
-    #     return translator.translate('veritas lux mea', src='fr', dest="en").text
+    # (french field, english field) pairs that can be translated from one another
+    TRANSLATED_FIELDS: ClassVar[Tuple[Tuple[str, str], ...]] = (
+        ("member_gatherer_title_fr", "member_gatherer_title_en"),
+        ("member_gatherer_desc_fr", "member_gatherer_desc_en"),
+    )
 
 
 class AllMembersInfo(BaseModel):
@@ -1,13 +1,13 @@
 from pathlib import Path
-from typing import List
+from typing import Dict, Hashable, List
 
 from pptx import Presentation
 
 from positive_ai.documentation.data_model import MemberInfo
 from positive_ai.utils.ppt import (
     ExtendedSlide,
-    replace_text_in_shape,
-    insert_image_in_shape,
+    ImageContent,
+    SlideContent,
     Deck,
 )
 
@@ -17,26 +17,37 @@ class FirstPage(ExtendedSlide):
     A class defining the main page.
     """
 
+    SHAPE_NAMES = {
+        "join_month": "Text Placeholder 1",
+        "name": "Text Placeholder 2",
+        "logo": "Picture Placeholder 3",
+    }
+
     def __init__(self, master_slide, member_info: MemberInfo, language: str):
         super().__init__(master_slide, language=language)
         self._member_info = member_info
 
+    @classmethod
+    def get_contents(
+        cls, member_info: MemberInfo, language: str
+    ) -> Dict[Hashable, SlideContent]:
+        contents: Dict[Hashable, SlideContent] = {
+            "join_month": member_info.member_join_month,
+            "name": member_info.member_name,
+        }
+        if member_info.member_logo_path:
+            contents["logo"] = ImageContent(member_info.member_logo_path, center=True)
+        return contents
+
     def fill(self):
-        replace_text_in_shape(
-            self.get_shape("Text Placeholder 1"), self._member_info.member_join_month
-        )
-        replace_text_in_shape(
-            self.get_shape("Text Placeholder 2"), self._member_info.member_name
-        )
-        if self._member_info.member_logo_path:
-            insert_image_in_shape(
-                self.get_shape("Picture Placeholder 3"),
-                self._member_info.member_logo_path,
-                center=True,
-            )
+        self.fill_contents(self.get_contents(self._member_info, self._language))
 
 
 class SecondPage(ExtendedSlide):
+    @classmethod
+    def get_contents(cls, infos, language: str) -> Dict[Hashable, SlideContent]:
+        return {}
+
     def fill(self):
         """nothing to do for this one"""
         pass
@@ -47,23 +58,32 @@ class ThirdPage(ExtendedSlide):
     A class defining the last page.
     """
 
+    SHAPE_NAMES = {"photo": "Picture Placeholder 1", "contact": "Text Placeholder 2"}
+
     def __init__(self, master_slide, member_info: MemberInfo, language: str):
         super().__init__(master_slide, language=language)
         self._member_info = member_info
 
-    def fill(self):
-        if self._language == "fr":
-            combined_text = f"{self._member_info.member_gatherer_firstname} {self._member_info.member_gatherer_lastname}\nréférent Positive AI\npour {self._member_info.member_name}\n{self._member_info.member_gatherer_email}"
-        elif self._language == "en":
-            combined_text = f"{self._member_info.member_gatherer_firstname} {self._member_info.member_gatherer_lastname}\nPositive AI repr\nfor {self._member_info.member_name}\n{self._member_info.member_gatherer_email}"
+    @classmethod
+    def get_contents(
+        cls, member_info: MemberInfo, language: str
+    ) -> Dict[Hashable, SlideContent]:
+        if language == "fr":
+            combined_text = f"{member_info.member_gatherer_firstname} {member_info.member_gatherer_lastname}\nréférent Positive AI\npour {member_info.member_name}\n{member_info.member_gatherer_email}"
+        elif language == "en":
+            combined_text = f"{member_info.member_gatherer_firstname} {member_info.member_gatherer_lastname}\nPositive AI repr\nfor {member_info.member_name}\n{member_info.member_gatherer_email}"
         else:
-            raise Exception(f"Unsupported language '{self._language}'")
-        replace_text_in_shape(self.get_shape("Text Placeholder 2"), combined_text)
+            raise Exception(f"Unsupported language '{language}'")
+        contents: Dict[Hashable, SlideContent] = {"contact": combined_text}
 
-        if self._member_info.member_gatherer_photo_path:
-            self.get_shape("Picture Placeholder 1").insert_picture(
-                self._member_info.member_gatherer_photo_path
+        if member_info.member_gatherer_photo_path:
+            contents["photo"] = ImageContent(
+                member_info.member_gatherer_photo_path, refit=False
             )
+        return contents
+
+    def fill(self):
+        self.fill_contents(self.get_contents(self._member_info, self._language))
 
 
 class MemberOnboardingDeck(Deck):
@@ -84,19 +104,19 @@ class MemberOnboardingDeck(Deck):
 
             # First slide
             front_layout = self.get_layout("first-page")
-            master = self._template_path.slides.add_slide(front_layout)
+            master = self.add_slide(front_layout)
             slide_list.append(
                 FirstPage(master, member_info=self._infos, language=self._language)
             )
 
             # Second slide
             disclaimer_layout = self.get_layout("second-page")
-            master = self._template_path.slides.add_slide(disclaimer_layout)
+            master = self.add_slide(disclaimer_layout)
             slide_list.append(SecondPage(master_slide=master, language=self._language))
 
             # Third slides
             end_layout = self.get_layout("third-page")
-            master = self._template_path.slides.add_slide(end_layout)
+            master = self.add_slide(end_layout)
             slide_list.append(
                 ThirdPage(
                     master_slide=master,
@@ -1,8 +1,5 @@
-from pathlib import Path
 import click
 
-from positive_ai.constants import SRC_DIR
-from positive_ai.documentation.presentation import MemberOnboardingDeck, MemberInfo
 from positive_ai.utils.click import SpecialHelpOrder
 
 
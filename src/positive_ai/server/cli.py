@@ -0,0 +1,68 @@
+import signal
+
+import click
+
+from positive_ai.utils.images import DEFAULT_IMAGE_DPI, IMAGE_PREPROCESSOR
+from positive_ai.utils.reproducible import BUILD_CLOCK, SOURCE_DATE_EPOCH
+
+
+@click.command(help="Run a local server generating flyers on demand")
+@click.option(
+    "--host", help="address to listen on", default="127.0.0.1", show_default=True
+)
+@click.option(
+    "--port", help="port to listen on", type=int, default=8765, show_default=True
+)
+@click.option(
+    "--socket",
+    "socket_path",
+    help="listen on this unix socket instead of a TCP port",
+    type=click.Path(dir_okay=False),
+)
+@click.option(
+    "--workers",
+    help="number of worker processes generating flyers concurrently (default: number of CPUs)",
+    type=click.IntRange(min=1),
+)
+@click.option(
+    "--image-dpi",
+    help="resolution at which logos and photos are downsized before embedding (0 keeps the originals)",
+    type=click.IntRange(min=0),
+    default=DEFAULT_IMAGE_DPI,
+    show_default=True,
+)
+@click.option(
+    "--build-date",
+    help=(
+        "date stamped in the flyers instead of today, making them byte-reproducible "
+        f"(defaults to ${SOURCE_DATE_EPOCH} when set)"
+    ),
+    type=click.DateTime(formats=["%Y-%m-%d"]),
+)
+def cli(host, port, socket_path, workers, image_dpi, build_date):
+    from positive_ai.server.service import FlyerService, make_server
+
+    IMAGE_PREPROCESSOR.configure(dpi=image_dpi)
+    try:
+        BUILD_CLOCK.configure(build_date or BUILD_CLOCK.date_from_environment())
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--build-date")
+    service = FlyerService(workers=workers)
+    server = make_server(service, host, port, socket_path=socket_path)
+    # stop gracefully when run as a service too
+    signal.signal(signal.SIGTERM, _raise_keyboard_interrupt)
+    print(
+        f"[+] Serving flyers on {socket_path or f'http://{host}:{port}'} (Ctrl+C to stop)"
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print("[+] Shutting down...", flush=True)
+        server.server_close()
+        service.shutdown()
+
+
+def _raise_keyboard_interrupt(signum, frame):
+    raise KeyboardInterrupt
@@ -0,0 +1,192 @@
+import datetime
+import json
+import os
+import socketserver
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path, PurePosixPath
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+from positive_ai.documentation.batch import (
+    FLYER_TEMPLATES,
+    LANGUAGES,
+    flyer_member_info,
+    generate_flyers,
+)
+from positive_ai.utils.images import IMAGE_PREPROCESSOR
+from positive_ai.utils.output import MemorySink
+from positive_ai.utils.ppt import TEMPLATE_CACHE
+from positive_ai.utils.reproducible import BUILD_CLOCK
+
+PPTX_CONTENT_TYPE = (
+    "application/vnd.openxmlformats-officedocument.presentationml.presentation"
+)
+
+
+class JobError(Exception):
+    """An error caused by the job itself (invalid member info, missing image, etc.), reported as a bad request."""
+
+
+def _warm_worker(
+    image_dpi: int, image_cache_dir: Path, build_date: Optional[datetime.datetime]
+):
+    """Worker initializer: apply the settings and parse the templates once for all the jobs of the worker."""
+    IMAGE_PREPROCESSOR.configure(dpi=image_dpi, cache_dir=image_cache_dir)
+    BUILD_CLOCK.configure(build_date)
+    for template_path in FLYER_TEMPLATES.values():
+        TEMPLATE_CACHE.load(template_path)
+
+
+def _run_flyer_job(member_config: Dict, languages: List[str], return_bytes: bool):
+    """Generate the flyers of one member in a worker, returning their paths or the content of the (only) flyer."""
+    ts = BUILD_CLOCK.now().strftime("%Y_%m_%d")
+    try:
+        infos = flyer_member_info(member_config)
+    except Exception as e:
+        raise JobError(str(e))
+    # the member id names the output directory and files
+    if any(part in infos.member_id for part in ("/", "\\", "..")):
+        raise JobError(
+            f"Invalid member name '{infos.member_name}': it cannot contain '/', '\\' or '..'"
+        )
+    for path in (infos.member_logo_path, infos.member_gatherer_photo_path):
+        if path and not os.path.isfile(path):
+            raise JobError(f"Image not found: {path}")
+
+    if return_bytes:
+        # sent straight back to the client, without going through a file
+        sink = MemorySink()
+        generate_flyers(infos, ts, languages=languages, verbose=False, sink=sink)
+        relative_path, content = sink.files[0]
+        return PurePosixPath(relative_path).name, content
+    outputs = generate_flyers(infos, ts, languages=languages, verbose=False)
+    return {"member_name": infos.member_name, "outputs": [str(p) for p in outputs]}
+
+
+class FlyerService(object):
+    """
+    Generates flyers on a pool of long-lived worker processes.
+
+    Each worker parses the templates once when it starts and keeps its caches (templates, prepared images) warm across
+    jobs, so a job only costs the fill and save of the decks.
+    """
+
+    def __init__(self, workers: int = None):
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_warm_worker,
+            initargs=(
+                IMAGE_PREPROCESSOR.dpi,
+                IMAGE_PREPROCESSOR.cache_dir,
+                BUILD_CLOCK.build_date,
+            ),
+        )
+
+    def generate_flyers(
+        self, member_config: Dict, languages: List[str], return_bytes: bool = False
+    ):
+        return self._executor.submit(
+            _run_flyer_job, member_config, languages, return_bytes
+        ).result()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+class FlyerRequestHandler(BaseHTTPRequestHandler):
+    """
+    The HTTP API of the service:
+    - `GET /health`: check the service is up;
+    - `POST /flyers[?language=fr|en][&output=path|bytes]`: generate the flyers of the member described by the JSON
+      body (same fields as a roster record). By default both languages are generated and the paths of the files are
+      returned as JSON; with `output=bytes` the .pptx of the (single) requested language is returned.
+    """
+
+    service: FlyerService = None
+
+    def address_string(self):
+        # unix sockets have no client address
+        return self.client_address[0] if self.client_address else "unix-socket"
+
+    def do_GET(self):
+        if urlparse(self.path).path == "/health":
+            self._send_json(HTTPStatus.OK, {"status": "ok"})
+        else:
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": "not found"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/flyers":
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": "not found"})
+            return
+
+        query = parse_qs(url.query)
+        languages = query.get("language", list(LANGUAGES))
+        return_bytes = query.get("output", ["path"])[0] == "bytes"
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            member_config = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(member_config, dict):
+                raise ValueError("the body must be a JSON object")
+            if any(language not in LANGUAGES for language in languages):
+                raise ValueError(f"languages must be in {list(LANGUAGES)}")
+            if return_bytes and len(languages) != 1:
+                raise ValueError("output=bytes requires a single language")
+        except ValueError as e:
+            self._send_json(HTTPStatus.BAD_REQUEST, {"error": str(e)})
+            return
+
+        try:
+            result = self.service.generate_flyers(
+                member_config, languages, return_bytes=return_bytes
+            )
+        except JobError as e:
+            self._send_json(HTTPStatus.BAD_REQUEST, {"error": str(e)})
+            return
+        except Exception as e:
+            self.log_error("Flyer generation failed: %r", e)
+            self._send_json(HTTPStatus.INTERNAL_SERVER_ERROR, {"error": repr(e)})
+            return
+
+        if return_bytes:
+            filename, content = result
+            self.send_response(HTTPStatus.OK)
+            self.send_header("Content-Type", PPTX_CONTENT_TYPE)
+            self.send_header(
+                "Content-Disposition", f'attachment; filename="{filename}"'
+            )
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+        else:
+            self._send_json(HTTPStatus.OK, result)
+
+    def _send_json(self, status: HTTPStatus, content: Dict):
+        body = json.dumps(content).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        # the socket file of a previous run would make bind fail
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+        super().server_bind()
+
+
+def make_server(service: FlyerService, host: str, port: int, socket_path: str = None):
+    """Create the HTTP server, on a unix socket if `socket_path` is given, on `host:port` otherwise."""
+    handler = type(
+        "BoundFlyerRequestHandler", (FlyerRequestHandler,), {"service": service}
+    )
+    if socket_path:
+        return ThreadingUnixHTTPServer(socket_path, handler)
+    return ThreadingHTTPServer((host, port), handler)
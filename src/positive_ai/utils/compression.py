@@ -0,0 +1,116 @@
+import io
+import zipfile
+from pathlib import PurePosixPath
+from typing import TYPE_CHECKING, Optional, Tuple
+
+if TYPE_CHECKING:
+    from pptx.opc.package import OpcPackage
+
+# the media formats that are compressed already: deflating them again costs time and saves next to nothing
+COMPRESSED_MEDIA_EXTENSIONS = frozenset(
+    (
+        "jpg",
+        "jpeg",
+        "jpe",
+        "png",
+        "gif",
+        "webp",
+        "mp3",
+        "m4a",
+        "mp4",
+        "m4v",
+        "mov",
+        "wmv",
+        "wma",
+        "docx",
+        "xlsx",
+        "xlsm",
+        "pptx",
+        "zip",
+    )
+)
+
+# the deflate level of the XML parts in fast-save mode, when none is given
+FAST_XML_LEVEL = 1
+
+
+class PackageCompression(object):
+    """
+    How the parts of the decks are compressed when saved.
+
+    By default, decks are saved the way python-pptx does: every part deflated at the default level. Batch runs can
+    trade size for throughput instead: store the already compressed media (pictures, videos, embedded documents) as
+    they are and deflate the XML parts at a lower level. The time and size of each save are recorded by the profiler
+    ("save" stage), to measure the trade-off.
+    """
+
+    def __init__(self):
+        self.store_media = False
+        self.xml_level: Optional[int] = None
+
+    def configure(self, fast: bool = False, xml_level: Optional[int] = None):
+        """
+        Args:
+            fast: store the already compressed media, and deflate the XML parts at `FAST_XML_LEVEL` by default
+            xml_level: the deflate level of the XML parts, from 0 (fastest) to 9 (smallest)
+        """
+        if xml_level is not None and not 0 <= xml_level <= 9:
+            raise ValueError(
+                f"the deflate level must be between 0 and 9, got {xml_level}"
+            )
+        self.store_media = fast
+        self.xml_level = FAST_XML_LEVEL if fast and xml_level is None else xml_level
+
+    @property
+    def default(self) -> bool:
+        """Whether the decks are compressed the way python-pptx does."""
+        return not self.store_media and self.xml_level is None
+
+    @property
+    def key(self) -> Tuple[bool, Optional[int]]:
+        """Identifies the settings, for caches holding compressed data."""
+        return self.store_media, self.xml_level
+
+    def method(self, name: str) -> Tuple[int, Optional[int]]:
+        """The compression method and level of the zip entry with the given name."""
+        if self.store_media and is_compressed_media(name):
+            return zipfile.ZIP_STORED, None
+        return zipfile.ZIP_DEFLATED, self.xml_level
+
+    def write(self, target: zipfile.ZipFile, name: str, blob: bytes):
+        """Add an entry to a zip archive, compressed according to the settings."""
+        compress_type, compresslevel = self.method(name)
+        target.writestr(
+            name, blob, compress_type=compress_type, compresslevel=compresslevel
+        )
+
+    def save_package(self, package: "OpcPackage") -> bytes:
+        """
+        Serialise a python-pptx package according to the settings. It writes the same entries in the same order as
+        `OpcPackage.save`, only their compression differs.
+        """
+        from pptx.opc.oxml import serialize_part_xml
+        from pptx.opc.packuri import CONTENT_TYPES_URI, PACKAGE_URI
+        from pptx.opc.serialized import _ContentTypesItem
+
+        parts = tuple(package.iter_parts())
+        output = io.BytesIO()
+        with zipfile.ZipFile(output, "w", strict_timestamps=False) as target:
+            self.write(
+                target,
+                CONTENT_TYPES_URI.lstrip("/"),
+                serialize_part_xml(_ContentTypesItem.xml_for(parts)),
+            )
+            self.write(target, PACKAGE_URI.rels_uri.membername, package._rels.xml)
+            for part in parts:
+                self.write(target, part.partname.membername, part.blob)
+                if part._rels:
+                    self.write(target, part.partname.rels_uri.membername, part.rels.xml)
+        return output.getvalue()
+
+
+PACKAGE_COMPRESSION = PackageCompression()
+
+
+def is_compressed_media(name: str) -> bool:
+    return PurePosixPath(name).suffix[1:].lower() in COMPRESSED_MEDIA_EXTENSIONS
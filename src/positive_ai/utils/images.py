@@ -0,0 +1,351 @@
+import hashlib
+import json
+import logging
+import math
+import os
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, Tuple, Union
+
+from positive_ai.constants import CACHE_DIR
+
+EMU_PER_INCH = 914400
+DEFAULT_IMAGE_DPI = 150
+JPEG_QUALITY = 85
+# bumped when the way images are resized changes, so that cached images are prepared again
+_RESIZE_VERSION = 2
+
+# output format and extension per source format, anything else is converted to PNG
+_OUTPUT_FORMATS = {
+    "JPEG": ("JPEG", ".jpg"),
+    "MPO": ("JPEG", ".jpg"),
+    "PNG": ("PNG", ".png"),
+}
+# the modes saved as PNG as they are, the others (CMYK, YCbCr, 16 bits...) are converted to RGB(A) first
+_PNG_MODES = frozenset(("1", "L", "LA", "P", "RGB", "RGBA"))
+
+
+@dataclass(frozen=True)
+class ImageFit(object):
+    """How an image fits a placeholder of a given size."""
+
+    # the cropping stretching the image over the whole placeholder (left, top, right, bottom, as fractions), like
+    # `CT_Picture.crop_to_fit`
+    crop: Tuple[float, float, float, float]
+    # the size of the image shrunk to show whole in the placeholder, in EMU
+    size: Tuple[int, int]
+
+    @classmethod
+    def compute(
+        cls, image_size: Tuple[int, int], view_size: Tuple[int, int]
+    ) -> "ImageFit":
+        image_width, image_height = image_size
+        available_width, available_height = view_size
+        view_aspect_ratio = available_width / available_height
+        image_aspect_ratio = image_width / image_height
+
+        if view_aspect_ratio < image_aspect_ratio:
+            margin = (1.0 - (view_aspect_ratio / image_aspect_ratio)) / 2.0
+            crop = (margin, 0.0, margin, 0.0)
+        elif view_aspect_ratio > image_aspect_ratio:
+            margin = (1.0 - (image_aspect_ratio / view_aspect_ratio)) / 2.0
+            crop = (0.0, margin, 0.0, margin)
+        else:
+            crop = (0.0, 0.0, 0.0, 0.0)
+
+        if view_aspect_ratio > image_aspect_ratio:
+            size = (int(image_aspect_ratio * available_height), available_height)
+        else:
+            size = (available_width, int(available_width / image_aspect_ratio))
+        return cls(crop, size)
+
+
+class ImageIndex(object):
+    """
+    A persistent index of image metadata keyed by the content hash of the images (their sha1, like python-pptx): pixel
+    size, format and DPI, and how the image fits each placeholder size it was inserted in.
+
+    An image is only decoded the first time it is seen, across decks and runs. Entries are stored one file per image,
+    so that concurrent processes never overwrite each other's entries.
+    """
+
+    def __init__(self, index_dir: Path):
+        self.index_dir = Path(index_dir)
+        self._entries: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def image(self, image_path: Union[str, Path]):
+        """
+        Load an image for python-pptx, with its properties taken from the index.
+
+        Returns:
+            image: a `pptx.parts.image.Image`, whose format, size and DPI are known without decoding it
+        """
+        from pptx.parts.image import Image
+
+        image = Image.from_file(str(image_path))
+        entry = self._entry(image.sha1, image.blob)
+        # python-pptx lazily reads these properties with Pillow on first access, fill them in beforehand
+        image.__dict__["_pil_props"] = (
+            entry["format"],
+            tuple(entry["size"]),
+            tuple(entry["dpi"]) if entry["dpi"] else None,
+        )
+        return image
+
+    def fit(self, image, view_size: Tuple[int, int]) -> ImageFit:
+        """How an image loaded by `image()` fits a placeholder of the given width and height, in EMU."""
+        view_key = f"{view_size[0]}x{view_size[1]}"
+        with self._lock:
+            entry = self._entries[image.sha1]
+            fit = entry["fits"].get(view_key)
+        if fit is not None:
+            return ImageFit(tuple(fit["crop"]), tuple(fit["size"]))
+
+        computed = ImageFit.compute(tuple(entry["size"]), view_size)
+        with self._lock:
+            entry["fits"][view_key] = {
+                "crop": computed.crop,
+                "size": computed.size,
+            }
+            self._write(image.sha1, entry)
+        return computed
+
+    def _entry(self, sha1: str, blob: bytes) -> Dict:
+        with self._lock:
+            entry = self._entries.get(sha1)
+        if entry is not None:
+            return entry
+
+        path = self._path(sha1)
+        try:
+            with open(path) as stream:
+                entry = json.load(stream)
+        except (OSError, ValueError):
+            from PIL import Image
+
+            with Image.open(BytesIO(blob)) as image:
+                dpi = image.info.get("dpi")
+                entry = {
+                    "format": image.format,
+                    "size": image.size,
+                    "dpi": tuple(map(float, dpi)) if isinstance(dpi, tuple) else None,
+                    "fits": {},
+                }
+            with self._lock:
+                self._write(sha1, entry)
+        with self._lock:
+            return self._entries.setdefault(sha1, entry)
+
+    def _path(self, sha1: str) -> Path:
+        return self.index_dir / sha1[:2] / f"{sha1}.json"
+
+    def _write(self, sha1: str, entry: Dict):
+        """Write an entry atomically, the lock being held."""
+        path = self._path(sha1)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        with open(tmp, "w") as stream:
+            json.dump(entry, stream)
+        os.replace(tmp, path)
+
+
+class ImagePreprocessor(object):
+    """
+    Downsizes and recompresses images to the pixel size of the placeholder they are embedded in.
+
+    Processed images are stored in an on-disk cache addressed by the content of the source image and the target
+    size, so each source image is processed only once across decks and runs. The metadata of the embedded images are
+    kept in an `ImageIndex` next to it.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Path = CACHE_DIR / "images",
+        dpi: int = DEFAULT_IMAGE_DPI,
+    ):
+        self._log = logging.getLogger(__name__)
+        self.cache_dir = Path(cache_dir)
+        self.index = ImageIndex(self.cache_dir / "index")
+        self.dpi = dpi
+        # in-process memo avoiding to hash the same unchanged file over and over
+        self._prepared: Dict[Tuple, str] = {}
+        # images loaded during the open sessions, see `session`
+        self._loaded: Dict[Tuple, object] = {}
+        self._sessions = 0
+        self._lock = threading.Lock()
+
+    def configure(self, dpi: int = None, cache_dir: Path = None):
+        """Change the target resolution and / or the cache location."""
+        if dpi is not None:
+            self.dpi = dpi
+        if cache_dir is not None:
+            self.cache_dir = Path(cache_dir)
+            self.index = ImageIndex(self.cache_dir / "index")
+        with self._lock:
+            self._prepared.clear()
+            self._loaded.clear()
+
+    @property
+    def enabled(self) -> bool:
+        return self.dpi > 0
+
+    def target_size(self, width_emu: int, height_emu: int) -> Tuple[int, int]:
+        """Pixel size of a placeholder at the configured resolution."""
+        return (
+            max(1, math.ceil(width_emu * self.dpi / EMU_PER_INCH)),
+            max(1, math.ceil(height_emu * self.dpi / EMU_PER_INCH)),
+        )
+
+    @contextmanager
+    def session(self):
+        """
+        Share the images loaded by the decks built inside the block, e.g. the language variants of a deck: each image is
+        read, prepared and hashed once, and every deck embeds the same bytes. Images are assumed not to change during
+        the session. Sessions can be nested and span threads.
+        """
+        with self._lock:
+            self._sessions += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._sessions -= 1
+                if not self._sessions:
+                    self._loaded.clear()
+
+    def load(self, image_path: Union[str, Path], width_emu: int, height_emu: int):
+        """
+        Load the image to embed in a placeholder of the given size: prepared (see `prepare`) and with its properties
+        taken from the index (see `ImageIndex.image`).
+
+        Returns:
+            image: a `pptx.parts.image.Image`
+        """
+        key = (str(image_path), width_emu, height_emu)
+        with self._lock:
+            image = self._loaded.get(key)
+        if image is None:
+            image = self.index.image(self.prepare(image_path, width_emu, height_emu))
+            with self._lock:
+                if self._sessions:
+                    self._loaded[key] = image
+        return image
+
+    def prepare(
+        self, image_path: Union[str, Path], width_emu: int, height_emu: int
+    ) -> str:
+        """
+        Get an image fitting a placeholder of the given size.
+
+        The image is scaled down (never up) so that it still covers the whole placeholder, keeping its aspect ratio.
+        Images that are already small enough are returned untouched.
+
+        Args:
+            image_path: path to the source image
+            width_emu: width of the target placeholder in EMU
+            height_emu: height of the target placeholder in EMU
+
+        Returns:
+            path: the path to the image to embed
+        """
+        if not self.enabled:
+            return str(image_path)
+
+        stat = os.stat(image_path)
+        memo_key = (
+            str(image_path),
+            stat.st_mtime_ns,
+            stat.st_size,
+            width_emu,
+            height_emu,
+            self.dpi,
+        )
+        with self._lock:
+            prepared = self._prepared.get(memo_key)
+        if prepared is None:
+            prepared = self._prepare(Path(image_path), width_emu, height_emu)
+            with self._lock:
+                self._prepared[memo_key] = prepared
+        return prepared
+
+    def _prepare(self, image_path: Path, width_emu: int, height_emu: int) -> str:
+        from PIL import Image
+
+        data = image_path.read_bytes()
+        target_width, target_height = self.target_size(width_emu, height_emu)
+        digest = hashlib.sha256(data)
+        digest.update(
+            f"{target_width}x{target_height}q{JPEG_QUALITY}r{_RESIZE_VERSION}".encode()
+        )
+        key = digest.hexdigest()
+        # keep the original file name: python-pptx uses it as the picture description
+        entry_dir = self.cache_dir / key[:2] / key
+
+        if entry_dir.is_dir():
+            for cached in entry_dir.iterdir():
+                if not cached.name.startswith("."):
+                    return str(cached)
+
+        with Image.open(BytesIO(data)) as image:
+            scale = max(target_width / image.width, target_height / image.height)
+            if scale >= 1 and image.format in _OUTPUT_FORMATS:
+                return str(image_path)
+
+            output_format, suffix = _OUTPUT_FORMATS.get(image.format, ("PNG", ".png"))
+            save_kwargs = {"optimize": True}
+            if output_format == "JPEG":
+                save_kwargs.update(quality=JPEG_QUALITY)
+                if "exif" in image.info:
+                    save_kwargs["exif"] = image.info["exif"]
+            if scale < 1:
+                # round up the dimension setting the scale, so that the image still covers the placeholder, and
+                # derive the other one from it, so that the aspect ratio holds
+                if target_width / image.width >= target_height / image.height:
+                    width = max(1, math.ceil(image.width * scale))
+                    height = max(1, round(width * image.height / image.width))
+                else:
+                    height = max(1, math.ceil(image.height * scale))
+                    width = max(1, round(height * image.width / image.height))
+                size = (width, height)
+                processed = image.resize(size, Image.LANCZOS)
+            else:
+                processed = image.copy()
+
+            output = BytesIO()
+            try:
+                processed = _in_savable_mode(processed, output_format)
+                processed.save(output, format=output_format, **save_kwargs)
+            except (OSError, ValueError) as e:
+                # embed the source as it is, like when images are not prepared
+                self._log.warning(
+                    f"Cannot prepare {image_path}, embedding it as is: {e}"
+                )
+                return str(image_path)
+
+        # write atomically so that concurrent runs never see a partial image
+        entry_dir.mkdir(parents=True, exist_ok=True)
+        target = entry_dir / (image_path.stem + suffix)
+        tmp = entry_dir / f".{target.name}.{os.getpid()}.tmp"
+        tmp.write_bytes(output.getvalue())
+        os.replace(tmp, target)
+        self._log.debug(
+            f"Prepared {image_path} ({len(data)} bytes) -> {target} ({output.tell()} bytes)"
+        )
+        return str(target)
+
+
+def _in_savable_mode(image, output_format: str):
+    """The image in a mode the output format stores, converted to RGB(A) if needed."""
+    if output_format == "JPEG" and image.mode not in ("RGB", "L", "CMYK"):
+        return image.convert("RGB")
+    if output_format == "PNG" and image.mode not in _PNG_MODES:
+        alpha = any(band in ("A", "a") for band in image.getbands())
+        return image.convert("RGBA" if alpha else "RGB")
+    return image
+
+
+IMAGE_PREPROCESSOR = ImagePreprocessor()
@@ -1,12 +1,80 @@
-from typing import Dict
+import json
+from pathlib import Path
+from typing import Dict, Iterator, Tuple, Union
 
-import yaml
+JSON_LINES_SUFFIXES = (".jsonl", ".ndjson")
 
 
 def read_yaml(config_file_path: str) -> Dict:
+    import yaml
+
     with open(config_file_path) as stream:
         try:
             loaded = yaml.safe_load(stream)
             return loaded
         except yaml.YAMLError as exc:
             raise exc
+
+
+def iter_records(config_file_path: Union[str, Path]) -> Iterator[Dict]:
+    """
+    Stream the records of a roster file one at a time, without loading the whole file in memory.
+
+    Supported layouts are JSON Lines (`.jsonl` / `.ndjson`, one record per line) and YAML, where each document is
+    either a single record or a list of records (the usual single-document roster).
+    """
+    for _, record in iter_numbered_records(config_file_path):
+        yield record
+
+
+def iter_numbered_records(
+    config_file_path: Union[str, Path],
+) -> Iterator[Tuple[int, Dict]]:
+    """Like `iter_records`, along with the line number where each record starts, for error reports."""
+    if Path(config_file_path).suffix.lower() in JSON_LINES_SUFFIXES:
+        with open(config_file_path) as stream:
+            for line_number, line in enumerate(stream, start=1):
+                if line.strip():
+                    yield line_number, _check_record(
+                        json.loads(line), config_file_path, line_number
+                    )
+        return
+
+    import yaml
+
+    with open(config_file_path) as stream:
+        loader = yaml.SafeLoader(stream)
+        try:
+            loader.get_event()  # stream start
+            while not loader.check_event(yaml.StreamEndEvent):
+                loader.get_event()  # document start
+                if loader.check_event(yaml.SequenceStartEvent):
+                    # compose and construct the items of a top level list one by one
+                    loader.get_event()
+                    while not loader.check_event(yaml.SequenceEndEvent):
+                        line_number = loader.peek_event().start_mark.line + 1
+                        node = loader.compose_node(None, None)
+                        record = loader.construct_document(node)
+                        yield line_number, _check_record(
+                            record, config_file_path, line_number
+                        )
+                    loader.get_event()
+                else:
+                    line_number = loader.peek_event().start_mark.line + 1
+                    record = loader.construct_document(loader.compose_node(None, None))
+                    if record is not None:
+                        yield line_number, _check_record(
+                            record, config_file_path, line_number
+                        )
+                loader.get_event()  # document end
+                loader.anchors = {}
+        finally:
+            loader.dispose()
+
+
+def _check_record(record, config_file_path, line_number: int) -> Dict:
+    if not isinstance(record, dict):
+        raise ValueError(
+            f"{config_file_path}:{line_number}: expected a record (mapping), got {type(record).__name__}"
+        )
+    return record
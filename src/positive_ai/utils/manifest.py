@@ -0,0 +1,205 @@
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple, Union
+
+from positive_ai import __version__
+
+MANIFEST_FILENAME = ".build-manifest.json"
+JOURNAL_FILENAME = ".batch-journal.jsonl"
+
+_FILE_DIGESTS: Dict[Tuple, str] = {}
+_FILE_DIGESTS_LOCK = threading.Lock()
+
+
+def hash_file(file_path: Union[str, Path]) -> str:
+    """
+    The sha256 of a file content, memoised on path, modification time and size.
+    """
+    stat = os.stat(file_path)
+    key = (str(file_path), stat.st_mtime_ns, stat.st_size)
+    with _FILE_DIGESTS_LOCK:
+        digest = _FILE_DIGESTS.get(key)
+    if digest is None:
+        digest = hashlib.sha256(Path(file_path).read_bytes()).hexdigest()
+        with _FILE_DIGESTS_LOCK:
+            _FILE_DIGESTS[key] = digest
+    return digest
+
+
+def hash_inputs(
+    records: Iterable = (),
+    template_path: Union[str, Path] = None,
+    image_paths: Iterable[Optional[Union[str, Path]]] = (),
+    **extra,
+) -> str:
+    """
+    Hash everything an output depends on.
+
+    Args:
+        records: the pydantic records rendered in the output
+        template_path: the template the output is built from
+        image_paths: the images embedded in the output (None entries are ignored)
+        extra: any other setting changing the output (language, image resolution, etc.), unset (None) ones are ignored
+
+    Returns:
+        digest: a hex digest that changes as soon as one of the inputs changes
+    """
+    digest = hashlib.sha256()
+    digest.update(f"version={__version__}\n".encode())
+    for record in records:
+        digest.update(record.model_dump_json().encode() + b"\n")
+    if template_path is not None:
+        digest.update(f"template={hash_file(template_path)}\n".encode())
+    for image_path in image_paths:
+        if image_path:
+            digest.update(f"image={hash_file(image_path)}\n".encode())
+    for key in sorted(extra):
+        if extra[key] is None:
+            continue
+        digest.update(f"{key}={extra[key]}\n".encode())
+    return digest.hexdigest()
+
+
+class BuildManifest(object):
+    """
+    Records, for each generated output, the hash of its inputs so that unchanged outputs are not rebuilt.
+
+    Entries are keyed by a logical output name (e.g. "flyer/<member_id>/fr") rather than by file name, because file
+    names embed the generation date. Without a path, the manifest starts empty and is never saved, for outputs that are
+    not kept from one run to the next (e.g. bundles).
+    """
+
+    def __init__(self, manifest_path: Optional[Path]):
+        self._path = Path(manifest_path) if manifest_path is not None else None
+        self._entries: Dict[str, Dict[str, str]] = {}
+        self._lock = threading.Lock()
+        if self._path is not None and self._path.exists():
+            with open(self._path) as stream:
+                self._entries = json.load(stream).get("outputs", {})
+
+    @classmethod
+    def for_output_dir(cls, output_dir: Path) -> "BuildManifest":
+        return cls(Path(output_dir) / MANIFEST_FILENAME)
+
+    def is_fresh(self, key: str, digest: str) -> bool:
+        """Whether the output `key` was built from the same inputs and still exists."""
+        with self._lock:
+            entry = self._entries.get(key)
+        return (
+            entry is not None
+            and entry["inputs"] == digest
+            and Path(entry["path"]).exists()
+        )
+
+    def record(self, key: str, digest: str, output_path: Path):
+        with self._lock:
+            self._entries[key] = {"inputs": digest, "path": str(output_path)}
+
+    def save(self):
+        """Write the manifest atomically."""
+        if self._path is None:
+            return
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self._path.with_name(f"{self._path.name}.{os.getpid()}.tmp")
+        with self._lock:
+            content = {"version": __version__, "outputs": self._entries}
+        with open(tmp, "w") as stream:
+            json.dump(content, stream, indent=2, sort_keys=True)
+        os.replace(tmp, self._path)
+
+
+class RunJournal(object):
+    """
+    An append-only record of a batch run: one JSON line per member as soon as it is done, with the hashes of its inputs
+    and of its outputs, or its error.
+
+    Lines are flushed one by one, so the journal survives a crashed or interrupted run. When resuming, the members
+    recorded as done with the same inputs (and whose outputs still exist) are not built again, even when every output
+    is forced to be rebuilt; failed members are retried.
+    """
+
+    def __init__(self, journal_path: Path, resume: bool = False):
+        self.path = Path(journal_path)
+        self._done: Dict[str, Dict] = {}
+        if resume and self.path.exists():
+            with open(self.path) as stream:
+                for line in stream:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # the last line of a crashed run may be truncated
+                        continue
+                    if entry.get("error") is None:
+                        self._done[entry["member_id"]] = entry
+                    else:
+                        self._done.pop(entry["member_id"], None)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._stream = open(self.path, "a" if resume else "w")
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_output_dir(cls, output_dir: Path, resume: bool = False) -> "RunJournal":
+        return cls(Path(output_dir) / JOURNAL_FILENAME, resume=resume)
+
+    def is_done(self, member_id: str, inputs: Dict[str, str]) -> bool:
+        """Whether a previous run built the member from the same inputs, and its outputs still exist."""
+        entry = self._done.get(member_id)
+        return (
+            entry is not None
+            and entry["inputs"] == inputs
+            and all(
+                Path(output["path"]).exists() for output in entry["outputs"].values()
+            )
+        )
+
+    def outputs(self, member_id: str) -> Dict[str, str]:
+        """The path of each output a previous run built for the member, by output name."""
+        entry = self._done.get(member_id, {})
+        return {
+            name: output["path"] for name, output in entry.get("outputs", {}).items()
+        }
+
+    def record(
+        self,
+        member_id: str,
+        member_name: str,
+        inputs: Dict[str, str],
+        outputs: Dict[str, Tuple[str, str]] = None,
+        error: str = None,
+    ):
+        """
+        Args:
+            member_id: the identifier of the member
+            member_name: the name of the member, for the failure report
+            inputs: the hash of the inputs of each output of the member by output name (e.g. the language), see
+                `hash_inputs`
+            outputs: the path and sha256 of each output built, by output name
+            error: why the member failed, if it did
+        """
+        entry = {
+            "member_id": member_id,
+            "member_name": member_name,
+            "inputs": inputs,
+            "outputs": {
+                name: {"path": path, "sha256": sha256}
+                for name, (path, sha256) in (outputs or {}).items()
+            },
+            "error": error,
+        }
+        with self._lock:
+            self._stream.write(json.dumps(entry) + "\n")
+            self._stream.flush()
+
+    def close(self):
+        with self._lock:
+            self._stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
@@ -0,0 +1,161 @@
+import abc
+import hashlib
+import json
+import os
+import threading
+import zipfile
+from pathlib import Path, PurePosixPath
+from typing import List, Optional, Tuple, Union
+
+from positive_ai import __version__
+from positive_ai.utils.manifest import BuildManifest, RunJournal
+from positive_ai.utils.reproducible import BUILD_CLOCK, zip_entry
+
+BUNDLE_MANIFEST_NAME = "manifest.json"
+
+
+class OutputSink(abc.ABC):
+    """
+    Where the generated documents go. Documents are identified by their path relative to the output root, e.g.
+    "member-specific/<member_id>/employee-onboarding/<file name>".
+    """
+
+    # whether worker processes can write to the sink themselves, otherwise they send the documents back to the main
+    # process (see `MemorySink`)
+    shared = True
+
+    @abc.abstractmethod
+    def write(self, relative_path: Union[str, Path], content: bytes) -> str:
+        """
+        Args:
+            relative_path: the path of the document relative to the output root
+            content: the content of the document
+
+        Returns:
+            location: where the document was written, for display and for the build manifest
+        """
+        pass
+
+    def build_manifest(self) -> BuildManifest:
+        """
+        The manifest of the outputs built in previous runs, to skip the ones that are up to date. Sinks whose outputs
+        are not kept from one run to the next get an empty manifest, so everything is rebuilt.
+        """
+        return BuildManifest(None)
+
+    def run_journal(self, resume: bool = False) -> Optional[RunJournal]:
+        """
+        The journal of batch runs writing to the sink, to resume them after a failure. Sinks that cannot be written to
+        again (e.g. a bundle) have none.
+        """
+        return None
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+class DirectorySink(OutputSink):
+    """Writes each document to its own file under a root directory."""
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+
+    def build_manifest(self) -> BuildManifest:
+        return BuildManifest.for_output_dir(self.root)
+
+    def run_journal(self, resume: bool = False) -> Optional[RunJournal]:
+        return RunJournal.for_output_dir(self.root, resume=resume)
+
+    def write(self, relative_path: Union[str, Path], content: bytes) -> str:
+        file_path = self.root / relative_path
+        # never write outside the root, whatever the path is made of (e.g. a member name holding '..')
+        try:
+            file_path.resolve().relative_to(self.root.resolve())
+        except ValueError:
+            raise ValueError(f"{relative_path} is outside of {self.root}")
+        file_path.parent.mkdir(exist_ok=True, parents=True, mode=0o770)
+        # write atomically, so that an interrupted run never leaves a truncated deck behind
+        tmp = file_path.with_name(f".{file_path.name}.{os.getpid()}.tmp")
+        tmp.write_bytes(content)
+        os.replace(tmp, file_path)
+        return str(file_path)
+
+
+class MemorySink(OutputSink):
+    """Keeps the documents in memory, e.g. in a worker process sending them back to the main one."""
+
+    shared = False
+
+    def __init__(self):
+        self.files: List[Tuple[str, bytes]] = []
+
+    def write(self, relative_path: Union[str, Path], content: bytes) -> str:
+        relative_path = PurePosixPath(relative_path).as_posix()
+        self.files.append((relative_path, content))
+        return relative_path
+
+
+class ZipBundleSink(OutputSink):
+    """
+    Streams all the documents into a single zip archive, without intermediate files.
+
+    Documents are stored as they are (.pptx files are already compressed). On close, a manifest listing every document
+    with its size and sha256 is added to the archive.
+    """
+
+    shared = False
+
+    def __init__(self, bundle_path: Path):
+        self.path = Path(bundle_path)
+        self.path.parent.mkdir(exist_ok=True, parents=True)
+        self._zip = zipfile.ZipFile(self.path, "w", compression=zipfile.ZIP_STORED)
+        self._entries = []
+        self._lock = threading.Lock()
+
+    def write(self, relative_path: Union[str, Path], content: bytes) -> str:
+        name = PurePosixPath(relative_path).as_posix()
+        with self._lock:
+            self._zip.writestr(self._entry(name), content)
+            self._entries.append(
+                {
+                    "path": name,
+                    "bytes": len(content),
+                    "sha256": hashlib.sha256(content).hexdigest(),
+                }
+            )
+        return f"{self.path}:{name}"
+
+    def close(self):
+        with self._lock:
+            if self._zip.fp is None:
+                return
+            manifest = {
+                "version": __version__,
+                "created": BUILD_CLOCK.now().isoformat(timespec="seconds"),
+                "outputs": self._entries,
+            }
+            self._zip.writestr(
+                self._entry(BUNDLE_MANIFEST_NAME),
+                json.dumps(manifest, indent=2),
+                compress_type=zipfile.ZIP_DEFLATED,
+            )
+            self._zip.close()
+
+    @staticmethod
+    def _entry(name: str) -> Union[str, zipfile.ZipInfo]:
+        # in reproducible mode, the bundle gets the same normalised metadata as the decks it holds
+        return (
+            zip_entry(name, BUILD_CLOCK.zip_date_time())
+            if BUILD_CLOCK.reproducible
+            else name
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,90 @@
+import queue
+import threading
+from typing import Any, Callable, Iterable, Iterator, Sequence
+
+# how many items can wait between two stages
+DEFAULT_QUEUE_SIZE = 2
+
+_DONE = object()
+
+
+class _Failure(object):
+    def __init__(self, exception: BaseException):
+        self.exception = exception
+
+
+def pipeline(
+    source: Iterable,
+    stages: Sequence[Callable[[Any], Any]],
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+) -> Iterator:
+    """
+    Run items through a sequence of stages, each stage in its own thread, connected by bounded queues.
+
+    The first stage consumes the items of `source`, each next stage the results of the previous one, and the results
+    of the last stage are yielded in the order of `source`. Stages work on different items at the same time, e.g. one
+    reads the inputs of the next item while another fills the current one and a third writes the previous one, which
+    overlaps disk I/O and compression (both releasing the GIL) with CPU bound work. The bounded queues keep at most
+    `queue_size` items waiting between two stages, however long `source` is.
+
+    An exception raised by `source` or by a stage stops the pipeline and is raised by the returned iterator. Closing
+    the iterator early stops the stages.
+    """
+    stop = threading.Event()
+    queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+
+    def put(q: queue.Queue, item) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def inputs(index: int) -> Iterator:
+        if index == 0:
+            yield from source
+            return
+        while not stop.is_set():
+            try:
+                item = queues[index - 1].get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                # let the failure through to the consumer
+                raise item.exception
+            yield item
+
+    def run(index: int, stage: Callable):
+        try:
+            for item in inputs(index):
+                if not put(queues[index], stage(item)):
+                    return
+        except BaseException as e:
+            put(queues[index], _Failure(e))
+            return
+        put(queues[index], _DONE)
+
+    threads = [
+        threading.Thread(
+            target=run, args=(index, stage), name=f"pipeline-{index}", daemon=True
+        )
+        for index, stage in enumerate(stages)
+    ]
+    for thread in threads:
+        thread.start()
+    try:
+        while True:
+            item = queues[-1].get()
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.exception
+            yield item
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
@@ -1,10 +1,29 @@
 import abc
+import copy
+import io
 import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Union
+from typing import Dict, Hashable, Iterable, List, Tuple, Union
+import pptx.presentation
 from pptx import Presentation
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+from pptx.oxml.shapes.groupshape import CT_GroupShape
+from pptx.oxml.shapes.picture import CT_Picture
+from pptx.oxml.shapes.shared import BaseShapeElement
+from pptx.parts.image import ImagePart
 from pptx.shapes.placeholder import *
-from pptx.slide import Slide
+from pptx.shapes.placeholder import PlaceholderPicture
+from pptx.shapes.shapetree import SlideShapeFactory
+from pptx.slide import Slide, SlideLayout
+from pptx.util import Emu
+
+from positive_ai.utils.compression import PACKAGE_COMPRESSION
+from positive_ai.utils.images import IMAGE_PREPROCESSOR, ImageFit
+from positive_ai.utils.profiling import PROFILER
+from positive_ai.utils.reproducible import BUILD_CLOCK, normalize_zip
 
 AnyPlaceholder = Union[
     LayoutPlaceholder,
@@ -19,11 +38,220 @@ AnyPlaceholder = Union[
 ]
 
 
+@dataclass(frozen=True)
+class LayoutInfo:
+    """Where a layout is in its template."""
+
+    name: str
+    # the position of the layout: index of its slide master, then index in the master
+    master_index: int
+    index: int
+
+
+class LayoutIndex(object):
+    """
+    The layouts of a template by name, across all its slide masters (`Presentation.slide_layouts` only lists the ones
+    of the first master).
+
+    The index only holds positions and names, so it is built once per template and shared by all the decks built from
+    it (see `TemplateCache.layouts`), each deck resolving the positions in its own copy of the template.
+    """
+
+    def __init__(
+        self, presentation: pptx.presentation.Presentation, source: str = "template"
+    ):
+        self._source = source
+        self._layouts: Dict[str, LayoutInfo] = {}
+        for master_index, master in enumerate(presentation.slide_masters):
+            for index, layout in enumerate(master.slide_layouts):
+                # a name used by several masters refers to the layout of the first one
+                self._layouts.setdefault(
+                    layout.name,
+                    LayoutInfo(
+                        name=layout.name, master_index=master_index, index=index
+                    ),
+                )
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._layouts
+
+    def __len__(self) -> int:
+        return len(self._layouts)
+
+    @property
+    def names(self) -> List[str]:
+        return list(self._layouts)
+
+    def __getitem__(self, name: str) -> LayoutInfo:
+        try:
+            return self._layouts[name]
+        except KeyError:
+            raise KeyError(
+                f"Cannot find layout named '{name}' in {self._source}. Available layouts: {self.names}"
+            )
+
+    def resolve(
+        self, presentation: pptx.presentation.Presentation, name: str
+    ) -> SlideLayout:
+        """The layout with the given name in a presentation built from the template."""
+        info = self[name]
+        return presentation.slide_masters[info.master_index].slide_layouts[info.index]
+
+
+TEMPLATE_CACHE_SIZE = 8
+# a parsed template, with its layout index
+_CachedTemplate = Tuple[pptx.presentation.Presentation, LayoutIndex]
+
+
+class TemplateCache(object):
+    """
+    A bounded LRU cache of parsed templates, keyed by template path and modification time, with their layout index.
+
+    The cached presentations are never handed out: each call to `load` returns an independent deep copy, which is much
+    cheaper than unzipping and parsing the template again.
+    """
+
+    def __init__(self, max_size: int = TEMPLATE_CACHE_SIZE):
+        self._max_size = max_size
+        self._templates: "OrderedDict[Tuple[str, int], _CachedTemplate]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._templates)
+
+    def load(self, template_path: Union[str, Path]) -> pptx.presentation.Presentation:
+        """
+        Get a fresh presentation object for the given template.
+
+        Args:
+            template_path: path to the .pptx template
+
+        Returns:
+            presentation: a python-pptx presentation that can be modified freely
+        """
+        return copy.deepcopy(self._get(template_path)[0])
+
+    def layouts(self, template_path: Union[str, Path]) -> LayoutIndex:
+        """Get the layout index of the given template, shared by all its presentations."""
+        return self._get(template_path)[1]
+
+    def _get(self, template_path: Union[str, Path]) -> _CachedTemplate:
+        path = Path(template_path).resolve()
+        key = (str(path), path.stat().st_mtime_ns)
+        with self._lock:
+            template = self._templates.get(key)
+            if template is None:
+                # an edited template replaces its stale entry
+                for stale_key in [k for k in self._templates if k[0] == key[0]]:
+                    del self._templates[stale_key]
+                presentation = Presentation(str(path))
+                template = (presentation, LayoutIndex(presentation, source=path.name))
+                self._templates[key] = template
+                while len(self._templates) > self._max_size:
+                    self._templates.popitem(last=False)
+            else:
+                self._templates.move_to_end(key)
+        return template
+
+    def clear(self):
+        with self._lock:
+            self._templates.clear()
+
+
+TEMPLATE_CACHE = TemplateCache()
+
+
+class FillPlan(object):
+    """
+    Where the contents of a slide go: the idx of the placeholder receiving each field, resolved once per layout.
+
+    Slides added from the same layout get the same placeholders, with the same names and idx, so the shape names used
+    by the slide classes only need to be resolved once. Each slide is then filled from a single pass over its shape
+    tree, without building name mappings or wrapping every shape.
+    """
+
+    def __init__(
+        self, shape_names: Dict[Hashable, str], placeholder_idx: Dict[Hashable, int]
+    ):
+        self._shape_names = shape_names
+        self._placeholder_idx = placeholder_idx
+
+    @classmethod
+    def compile(cls, slide: Slide, shape_names: Dict[Hashable, str]) -> "FillPlan":
+        """
+        Args:
+            slide: a slide added from the layout
+            shape_names: the name of the shape receiving each field
+
+        Returns:
+            plan: the fill plan of the layout of the slide
+        """
+        idx_by_name = {
+            e.shape_name: e.ph_idx for e in slide.shapes._spTree.iter_ph_elms()
+        }
+        missing = [name for name in shape_names.values() if name not in idx_by_name]
+        if missing:
+            raise KeyError(
+                f"Cannot find placeholders named {missing} on layout '{slide.slide_layout.name}'. "
+                f"Available placeholders: {list(idx_by_name)}"
+            )
+        return cls(
+            shape_names,
+            {field: idx_by_name[name] for field, name in shape_names.items()},
+        )
+
+    def idx(self, field: Hashable) -> int:
+        """The idx of the placeholder receiving the field."""
+        return self._placeholder_idx[field]
+
+    def matches(self, elements: Dict[int, BaseShapeElement]) -> bool:
+        """Whether the placeholders of a slide are the ones the plan was compiled for (e.g. same template)."""
+        return all(
+            idx in elements and elements[idx].shape_name == self._shape_names[field]
+            for field, idx in self._placeholder_idx.items()
+        )
+
+    def shapes(
+        self,
+        slide: Slide,
+        elements: Dict[int, BaseShapeElement],
+        fields: Iterable[Hashable] = None,
+    ) -> Dict[Hashable, AnyPlaceholder]:
+        """The placeholders of the slide receiving the given fields (all by default)."""
+        placeholders = slide.placeholders
+        return {
+            field: SlideShapeFactory(
+                elements[self._placeholder_idx[field]], placeholders
+            )
+            for field in (self._placeholder_idx if fields is None else fields)
+        }
+
+
+# fill plans by slide class and layout name, shared by all the decks
+_FILL_PLANS: Dict[Tuple[type, str], FillPlan] = {}
+
+
+@dataclass(frozen=True)
+class ImageContent:
+    """An image to insert in a picture placeholder, see `insert_image_in_shape`."""
+
+    path: str
+    refit: bool = True
+    center: bool = False
+
+
+# what a field of a slide receives: a text or an image
+SlideContent = Union[str, ImageContent]
+
+
 class ExtendedSlide(Slide):
     """
     A class defining the slide holding all KPI data. It extends to base Slide class of pptx.
     """
 
+    # the name of the shape receiving each field of the slide, see `get_field_shapes`
+    SHAPE_NAMES: Dict[Hashable, str] = {}
+
     def __init__(self, master_slide: Slide, language: str):
         self._log = logging.getLogger(__name__)
         super().__init__(element=master_slide.element, part=master_slide.part)
@@ -38,6 +266,37 @@ class ExtendedSlide(Slide):
         """
         pass
 
+    @classmethod
+    def get_contents(cls, infos, language: str) -> Dict[Hashable, SlideContent]:
+        """
+        Describe the contents of the slide as data, by field of `SHAPE_NAMES`.
+
+        Slides implementing it can be filled with `fill_contents`, and built by the XML engine
+        (`positive_ai.utils.ppt_xml`) without the python-pptx object model.
+
+        Args:
+            infos: the infos the slide is built from
+            language: the language of the slide
+
+        Returns:
+            contents: the text or image of each field to fill, in filling order
+        """
+        raise NotImplementedError(f"{cls.__name__} does not describe its contents")
+
+    def fill_contents(self, contents: Dict[Hashable, SlideContent]):
+        """Fill the slide with contents described by `get_contents`."""
+        shapes = self.get_field_shapes(contents)
+        for field, content in contents.items():
+            if isinstance(content, ImageContent):
+                insert_image_in_shape(
+                    shapes[field],
+                    content.path,
+                    refit=content.refit,
+                    center=content.center,
+                )
+            else:
+                replace_text_in_shape(shapes[field], content)
+
     @property
     def _shape_name_to_index(self):
         """
@@ -59,12 +318,38 @@ class ExtendedSlide(Slide):
         Returns:
             shape: the Shape object
         """
-        try:
-            return self.shapes[self._shape_name_to_index[shape_name]]
-        except KeyError:
-            raise KeyError(
-                f"Cannot find shape named {shape_name}. Available shapes: {list(self._shape_name_to_index.keys())}"
-            )
+        with PROFILER.stage("get_shape"):
+            try:
+                return self.shapes[self._shape_name_to_index[shape_name]]
+            except KeyError:
+                raise KeyError(
+                    f"Cannot find shape named {shape_name}. Available shapes: {list(self._shape_name_to_index.keys())}"
+                )
+
+    def get_field_shapes(
+        self, fields: Iterable[Hashable] = None
+    ) -> Dict[Hashable, AnyPlaceholder]:
+        """
+        Access the placeholders receiving the fields declared in `SHAPE_NAMES`, in a single pass over the slide.
+
+        The names are resolved to placeholder idx once per slide class and layout (the fill plan), then reused by every
+        slide built from that layout, in every deck.
+
+        Args:
+            fields: the fields to get the shapes of, all the fields of `SHAPE_NAMES` by default
+
+        Returns:
+            shapes: the placeholder receiving each field
+        """
+        with PROFILER.stage("get_field_shapes"):
+            elements = {e.ph_idx: e for e in self.shapes._spTree.iter_ph_elms()}
+            key = (type(self), self.slide_layout.name)
+            plan = _FILL_PLANS.get(key)
+            # a layout with the same name in another template may number its placeholders differently
+            if plan is None or not plan.matches(elements):
+                plan = FillPlan.compile(self, self.SHAPE_NAMES)
+                _FILL_PLANS[key] = plan
+            return plan.shapes(self, elements, fields)
 
     def __repr__(self) -> str:
         """
@@ -83,8 +368,22 @@ class ExtendedSlide(Slide):
 class Deck(object):
     __metaclass__ = abc.ABCMeta
 
-    def __init__(self, infos, language: str, template_path: Path):
-        self._template_path = Presentation(str(template_path))
+    def __init__(self, infos, language: str, template_path: Union[str, Path]):
+        # label of the deck in profiling traces
+        self._profile_label = "/".join(
+            str(part)
+            for part in (
+                type(self).__name__,
+                getattr(infos, "member_id", None),
+                language,
+            )
+            if part is not None
+        )
+        with PROFILER.scope(deck=self._profile_label):
+            with PROFILER.stage("template_load") as stage:
+                self._template_path = TEMPLATE_CACHE.load(template_path)
+                self._layout_index = TEMPLATE_CACHE.layouts(template_path)
+                stage.bytes = Path(template_path).stat().st_size
         self._infos = infos
         self._language = language
 
@@ -92,6 +391,10 @@ class Deck(object):
 
         # cached properties
         self._slides = None
+        self._filled = False
+        # the shape tree of the first slide added from each layout, before filling, by layout partname
+        self._prototypes: Dict[str, CT_GroupShape] = {}
+        self._layouts: Dict[str, SlideLayout] = {}
 
     @property
     @abc.abstractmethod
@@ -100,9 +403,56 @@ class Deck(object):
             "You must override this attribute to define the slides of your presentation"
         )
 
-    def get_layout(self, name: str):
-        layouts = {layout.name: layout for layout in self._template_path.slide_layouts}
-        return layouts[name]
+    def get_layout(self, name: str) -> SlideLayout:
+        """
+        Get a layout of the template by name, from any of its slide masters.
+
+        Raises:
+            KeyError: when the template has no such layout, listing the available ones
+        """
+        with PROFILER.stage("get_layout"):
+            layout = self._layouts.get(name)
+            if layout is None:
+                layout = self._layout_index.resolve(self._template_path, name)
+                self._layouts[name] = layout
+            return layout
+
+    def add_slide(self, layout: SlideLayout) -> Slide:
+        """
+        Add a slide to the presentation from the given layout.
+
+        python-pptx instantiates the placeholders of the layout one by one for each new slide. Only the first slide of
+        each layout is built that way, and its shape tree is kept as a prototype: the next slides get a copy of it,
+        which gives the same XML for a fraction of the cost on decks of hundreds of slides.
+        """
+        with PROFILER.stage("add_slide"):
+            slides = self._template_path.slides
+            prototype = self._prototypes.get(layout.part.partname)
+            if prototype is None:
+                slide = slides.add_slide(layout)
+                self._prototypes[layout.part.partname] = copy.deepcopy(
+                    slide.shapes._spTree
+                )
+                return slide
+            r_id, slide = slides.part.add_slide(layout)
+            # the shapes of the slide must not be accessed before, they would keep the blank shape tree
+            cSld = slide._element.cSld
+            cSld.replace(cSld.spTree, copy.deepcopy(prototype))
+            slides._sldIdLst.add_sldId(r_id)
+            return slide
+
+    def fill(self):
+        """Fill all the slides with numbers and images (only once, later calls do nothing)."""
+        if not self._filled:
+            with PROFILER.scope(deck=self._profile_label):
+                with PROFILER.stage("slide_creation"):
+                    slides = self.slides
+                for index, s in enumerate(slides):
+                    with PROFILER.scope(slide=index), PROFILER.stage(
+                        "fill_slide", slide_type=type(s).__name__
+                    ):
+                        s.fill()
+            self._filled = True
 
     def save(self, file_path: Path = None):
         """Save in the provided directory."""
@@ -115,12 +465,26 @@ class Deck(object):
         if not file_path.parent.exists():
             file_path.parent.mkdir(exist_ok=True, parents=True, mode=0o770)
 
-        # 2 fill all the slides with numbers and images
-        for s in self.slides:
-            s.fill()
-
-        # save the underlying presentation object
-        self._template_path.save(str(file_path))
+        # 2 fill all the slides with numbers and images, and save the underlying presentation object
+        file_path.write_bytes(self.to_bytes())
+
+    def to_bytes(self) -> bytes:
+        """Fill all the slides and serialise the presentation in memory, e.g. to stream it into an archive."""
+        self.fill()
+        with PROFILER.scope(deck=self._profile_label):
+            with PROFILER.stage("save") as stage:
+                if PACKAGE_COMPRESSION.default:
+                    buffer = io.BytesIO()
+                    self._template_path.save(buffer)
+                    content = buffer.getvalue()
+                else:
+                    content = PACKAGE_COMPRESSION.save_package(
+                        self._template_path.part.package
+                    )
+                if BUILD_CLOCK.reproducible:
+                    content = normalize_zip(content, BUILD_CLOCK.zip_date_time())
+                stage.bytes = len(content)
+        return content
 
 
 def replace_text_in_shape(shape: Shape, new_text: str):
@@ -137,43 +501,104 @@ def replace_text_in_shape(shape: Shape, new_text: str):
         raise TypeError("shape as no text box")
 
 
+# placeholders still holding an `sp` (filled picture placeholders become a `pic`) whose text is "": no text body, or
+# a single paragraph with no text and no line break (several paragraphs give "\n", a line break "\v")
+_EMPTY_PLACEHOLDERS_XPATH = (
+    "./p:sp[p:nvSpPr/p:nvPr/p:ph]"
+    "[not(p:txBody) or (count(p:txBody/a:p) <= 1 and not(p:txBody/a:p/a:br) and not(p:txBody//a:t[. != '']))]"
+)
+
+
+def remove_empty_placeholders(slide: Slide) -> int:
+    """
+    Remove all the placeholders left empty on the slide (text and picture placeholders), so that their prompt text
+    does not show in the presentation. Like the text of their text frame, placeholders holding several empty paragraphs
+    or a line break are not empty, and are kept.
+
+    The placeholders are found with a single XPath query over the shape tree, without creating shape objects.
+
+    Returns:
+        removed: the number of placeholders removed
+    """
+    with PROFILER.stage("remove_placeholders"):
+        sp_tree = slide.shapes._spTree
+        empty = sp_tree.xpath(_EMPTY_PLACEHOLDERS_XPATH)
+        for sp in empty:
+            sp_tree.remove(sp)
+        return len(empty)
+
+
 def insert_image_in_shape(
     placeholder: Union[Shape, AnyPlaceholder],
     image_path: str,
     refit: bool = True,
     center: bool = False,
 ):
-    # Get initial image placeholder left and top positions
-    picture = placeholder.insert_picture(image_path)
+    with PROFILER.stage("insert_image") as stage:
+        _insert_image_in_shape(placeholder, image_path, refit, center, stage)
+
+
+def _insert_image_in_shape(placeholder, image_path, refit, center, stage):
+    # Downsize the image to what the placeholder can actually display
+    with PROFILER.stage("prepare_image"):
+        image = IMAGE_PREPROCESSOR.load(
+            image_path, placeholder.width, placeholder.height
+        )
+    index = IMAGE_PREPROCESSOR.index
+    stage.bytes = len(image.blob)
+
+    # Insert the picture cropped to fill the placeholder, like `PicturePlaceholder.insert_picture` but without
+    # decoding the image again
+    slide_part = placeholder.part
+    image_part = slide_part.package._image_parts._find_by_sha1(
+        image.sha1
+    ) or ImagePart.new(slide_part.package, image)
+    rId = slide_part.relate_to(image_part, RT.IMAGE)
+    pic = CT_Picture.new_ph_pic(
+        placeholder.shape_id, placeholder.name, image_part.desc, rId
+    )
+    pic.blipFill.crop(index.fit(image, (placeholder.width, placeholder.height)).crop)
+    parent = placeholder._parent
+    placeholder._replace_placeholder_with(pic)
 
     if refit:
-        pos_left, pos_top = picture.left, picture.top
-        available_width = picture.width
-        available_height = picture.height
-
-        image_width, image_height = picture.image.size
-        placeholder_aspect_ratio = float(available_width) / float(available_height)
-        image_aspect_ratio = float(image_width) / float(image_height)
-
-        picture.crop_top = 0
-        picture.crop_left = 0
-        picture.crop_bottom = 0
-        picture.crop_right = 0
-
-        # ---if the placeholder is "wider" in aspect, shrink the picture width while
-        # ---maintaining the image aspect ratio
-        if placeholder_aspect_ratio > image_aspect_ratio:
-            picture.width = int(image_aspect_ratio * available_height)
-            picture.height = available_height
-
-        # ---otherwise shrink the height
-        else:
-            picture.height = int(available_width / image_aspect_ratio)
-            picture.width = available_width
+        # the picture inherits its position and size from the layout placeholder
+        picture = PlaceholderPicture(pic, parent)
+        area = (picture.left, picture.top, picture.width, picture.height)
+        _refit_picture(pic, area, index.fit(image, area[2:]), center)
 
-        # Set the picture left and top position to the initial placeholder one
-        picture.left, picture.top = pos_left, pos_top
 
-        if center:
-            picture.top = picture.top + int((available_height - picture.height) / 2)
-            picture.left = picture.left + int((available_width - picture.width) / 2)
+def _refit_picture(
+    pic: CT_Picture,
+    area: Tuple[int, int, int, int],
+    fit: ImageFit,
+    center: bool,
+):
+    """
+    Shrink a picture inserted in a placeholder so that the whole image shows, keeping its aspect ratio.
+
+    Works on the `p:pic` element so that it is shared with the XML engine (see `positive_ai.utils.ppt_xml`).
+
+    Args:
+        pic: the picture element
+        area: the left, top, width and height of the placeholder
+        fit: how the image fits the placeholder (see `ImageIndex.fit`)
+        center: center the picture in the placeholder area instead of aligning it top left
+    """
+    pos_left, pos_top, available_width, available_height = area
+    width, height = fit.size
+
+    pic.srcRect_t = 0
+    pic.srcRect_l = 0
+    pic.srcRect_b = 0
+    pic.srcRect_r = 0
+
+    # the fit already shrinks the width or the height, whichever keeps the image aspect ratio
+    pic.cx, pic.cy = Emu(width), Emu(height)
+
+    # place the picture in the center of the placeholder area, or at its top left corner
+    if center:
+        pic.x = Emu(pos_left + int((available_width - width) / 2))
+        pic.y = Emu(pos_top + int((available_height - height) / 2))
+    else:
+        pic.x, pic.y = Emu(pos_left), Emu(pos_top)
@@ -0,0 +1,358 @@
+"""
+An engine building decks directly at the XML level, for high volume decks such as the member flyers.
+
+The python-pptx path loads the whole template as objects, adds and fills the slides through proxy objects, then
+serialises and compresses every part of the package again. Most of that work is the same for every deck built from a
+template, so this engine does it once per template:
+- the slides of the deck are added with python-pptx (through the deck class itself) and the result is saved;
+- the parts that never change (masters, layouts, theme, media, slides without placeholders, etc.) are kept as an
+  already compressed zip;
+- the slides holding placeholders are kept as XML, along with their fill plan and the area of their placeholders.
+
+Each deck then only parses and fills a few small slide parts, and appends them to a copy of the compressed zip with
+the images it embeds: unchanged parts are copied byte for byte. The slides must describe their contents as data
+(`ExtendedSlide.get_contents`), and the XML is edited the same way python-pptx does, so that both paths give the same
+parts.
+"""
+
+import io
+import threading
+import zipfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Hashable, List, Tuple, Type, Union
+
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+from pptx.opc.oxml import CT_Relationships, CT_Types, serialize_part_xml
+from pptx.opc.packuri import CONTENT_TYPES_URI, PackURI
+from pptx.opc.spec import default_content_types
+from pptx.oxml import parse_xml
+from pptx.oxml.shapes.autoshape import CT_Shape
+from pptx.oxml.shapes.picture import CT_Picture
+from pptx.parts.image import Image, ImagePart
+
+from positive_ai.utils.compression import PACKAGE_COMPRESSION
+from positive_ai.utils.images import IMAGE_PREPROCESSOR
+from positive_ai.utils.ppt import (
+    Deck,
+    ExtendedSlide,
+    FillPlan,
+    ImageContent,
+    SlideContent,
+    _refit_picture,
+)
+from positive_ai.utils.profiling import PROFILER
+from positive_ai.utils.reproducible import BUILD_CLOCK, normalize_zip
+
+
+@dataclass
+class _SlideTemplate:
+    """A slide to fill, as saved by python-pptx before filling."""
+
+    slide_cls: Type[ExtendedSlide]
+    partname: PackURI
+    xml: bytes
+    rels_xml: bytes
+    plan: FillPlan
+    # left, top, width and height of each placeholder, by idx
+    areas: Dict[int, Tuple[int, int, int, int]]
+
+
+class XmlTemplate(object):
+    """
+    A template prepared for the XML engine, for a given deck class and language. Use `XmlTemplate.load` to get one.
+    """
+
+    def __init__(
+        self, deck_cls: Type[Deck], template_path: Union[str, Path], language: str
+    ):
+        self._deck_cls = deck_cls
+        self._language = language
+
+        # build the slides the python-pptx way, without filling them
+        deck = deck_cls(infos=None, language=language, template_path=template_path)
+        presentation = deck._template_path
+        slides: List[_SlideTemplate] = []
+        for slide in deck.slides:
+            if type(slide).get_contents is ExtendedSlide.get_contents:
+                raise TypeError(
+                    f"{type(slide).__name__} does not describe its contents, {deck_cls.__name__} cannot be built "
+                    f"by the XML engine"
+                )
+            if not slide.SHAPE_NAMES:
+                continue
+            slides.append(
+                _SlideTemplate(
+                    slide_cls=type(slide),
+                    partname=slide.part.partname,
+                    xml=b"",
+                    rels_xml=b"",
+                    plan=FillPlan.compile(slide, slide.SHAPE_NAMES),
+                    areas={
+                        ph.placeholder_format.idx: (
+                            ph.left,
+                            ph.top,
+                            ph.width,
+                            ph.height,
+                        )
+                        for ph in slide.placeholders
+                    },
+                )
+            )
+
+        # images already in the package, which python-pptx reuses when the same image is inserted
+        package = presentation.part.package
+        self._images: Dict[str, Tuple[PackURI, str]] = {}
+        self._image_idxs = []
+        for part in package.iter_parts():
+            if part.partname.startswith("/ppt/media/image") and part.partname.idx:
+                self._image_idxs.append(part.partname.idx)
+            if isinstance(part, ImagePart):
+                self._images.setdefault(part.sha1, (part.partname, part.desc))
+
+        saved = io.BytesIO()
+        presentation.save(saved)
+
+        # split the package between the parts to rewrite and the ones to copy as they are
+        rewritten = {CONTENT_TYPES_URI.lstrip("/")}
+        for slide in slides:
+            rewritten.add(slide.partname.membername)
+            rewritten.add(slide.partname.rels_uri.membername)
+        base = io.BytesIO()
+        with zipfile.ZipFile(saved) as source, zipfile.ZipFile(
+            base, "w", compression=zipfile.ZIP_DEFLATED
+        ) as target:
+            for info in source.infolist():
+                if info.filename not in rewritten:
+                    if PACKAGE_COMPRESSION.default:
+                        target.writestr(info, source.read(info))
+                    else:
+                        PACKAGE_COMPRESSION.write(
+                            target, info.filename, source.read(info)
+                        )
+            content_types = parse_xml(source.read(CONTENT_TYPES_URI.lstrip("/")))
+            for slide in slides:
+                slide.xml = source.read(slide.partname.membername)
+                slide.rels_xml = source.read(slide.partname.rels_uri.membername)
+        self._base = base.getvalue()
+        self._slides = slides
+        self._defaults = {
+            e.get("Extension"): e.get("ContentType")
+            for e in content_types.iterchildren("{*}Default")
+        }
+        self._overrides = {
+            e.get("PartName"): e.get("ContentType")
+            for e in content_types.iterchildren("{*}Override")
+        }
+
+    @classmethod
+    def load(
+        cls, deck_cls: Type[Deck], template_path: Union[str, Path], language: str
+    ) -> "XmlTemplate":
+        """Get the prepared template, preparing it on first use (and again if the template file changes)."""
+        path = Path(template_path).resolve()
+        # the unchanged parts are kept compressed, with the compression settings of the time
+        key = (deck_cls, str(path), language, PACKAGE_COMPRESSION.key)
+        mtime = path.stat().st_mtime_ns
+        with _XML_TEMPLATES_LOCK:
+            cached = _XML_TEMPLATES.get(key)
+            if cached is None or cached[0] != mtime:
+                with PROFILER.stage("template_prepare") as stage:
+                    cached = (mtime, cls(deck_cls, path, language))
+                    stage.bytes = len(cached[1]._base)
+                _XML_TEMPLATES[key] = cached
+        return cached[1]
+
+    def fill(self, infos) -> "XmlDeck":
+        """Fill the slides for the given infos, the deck being serialised later (see `XmlDeck.to_bytes`)."""
+        label = "/".join(
+            str(part)
+            for part in (
+                self._deck_cls.__name__,
+                getattr(infos, "member_id", None),
+                self._language,
+            )
+            if part is not None
+        )
+        package = _PackageBuilder(self._images, self._image_idxs)
+        parts: List[Tuple[str, bytes]] = []
+        with PROFILER.scope(deck=label, engine="xml"):
+            for index, slide in enumerate(self._slides):
+                with PROFILER.scope(slide=index), PROFILER.stage(
+                    "fill_slide", slide_type=slide.slide_cls.__name__
+                ):
+                    contents = slide.slide_cls.get_contents(infos, self._language)
+                    xml, rels_xml = package.fill_slide(slide, contents)
+                parts.append((slide.partname.membername, xml))
+                parts.append((slide.partname.rels_uri.membername, rels_xml))
+        return XmlDeck(self, label, package, parts)
+
+
+class XmlDeck(object):
+    """A deck filled by an `XmlTemplate`, not serialised yet."""
+
+    def __init__(
+        self,
+        template: XmlTemplate,
+        label: str,
+        package: "_PackageBuilder",
+        parts: List[Tuple[str, bytes]],
+    ):
+        self._template = template
+        self._label = label
+        self._package = package
+        self._parts = parts
+
+    def to_bytes(self) -> bytes:
+        """Append the filled slides and their images to the unchanged parts of the template, as a .pptx file."""
+        template = self._template
+        with PROFILER.scope(deck=self._label, engine="xml"), PROFILER.stage(
+            "save"
+        ) as stage:
+            output = io.BytesIO(template._base)
+            with zipfile.ZipFile(
+                output, "a", compression=zipfile.ZIP_DEFLATED, strict_timestamps=False
+            ) as target:
+                PACKAGE_COMPRESSION.write(
+                    target,
+                    CONTENT_TYPES_URI.lstrip("/"),
+                    self._package.content_types_xml(
+                        template._defaults, template._overrides
+                    ),
+                )
+                for name, blob in self._parts + self._package.media:
+                    PACKAGE_COMPRESSION.write(target, name, blob)
+            content = output.getvalue()
+            if BUILD_CLOCK.reproducible:
+                content = normalize_zip(content, BUILD_CLOCK.zip_date_time())
+            stage.bytes = len(content)
+        return content
+
+
+_XML_TEMPLATES: Dict[Tuple, Tuple[int, XmlTemplate]] = {}
+_XML_TEMPLATES_LOCK = threading.Lock()
+
+
+class _PackageBuilder(object):
+    """The parts added to the package while building one deck: images, and their relationships."""
+
+    def __init__(self, images: Dict[str, Tuple[PackURI, str]], image_idxs: List[int]):
+        self._images = dict(images)
+        self._image_idxs = sorted(image_idxs)
+        self._content_types: Dict[PackURI, str] = {}
+        self.media: List[Tuple[str, bytes]] = []
+
+    def fill_slide(
+        self, slide: _SlideTemplate, contents: Dict[Hashable, SlideContent]
+    ) -> Tuple[bytes, bytes]:
+        """Fill the slide XML with the contents. Returns the XML of the slide and of its relationships."""
+        root = parse_xml(slide.xml)
+        sp_tree = root.cSld.spTree
+        elements = {e.ph_idx: e for e in sp_tree.iter_ph_elms()}
+        rels = _SlideRels(slide.partname, slide.rels_xml)
+        for field, content in contents.items():
+            idx = slide.plan.idx(field)
+            if isinstance(content, ImageContent):
+                with PROFILER.stage("insert_image") as stage:
+                    self._insert_image(
+                        elements[idx], slide.areas[idx], content, rels, stage
+                    )
+            else:
+                _replace_text(elements[idx], content)
+        return serialize_part_xml(root), rels.xml()
+
+    def _insert_image(self, sp, area, content: ImageContent, rels, stage):
+        """Replace a picture placeholder with an image, like `PicturePlaceholder.insert_picture`."""
+        with PROFILER.stage("prepare_image"):
+            image = IMAGE_PREPROCESSOR.load(content.path, area[2], area[3])
+        index = IMAGE_PREPROCESSOR.index
+        stage.bytes = len(image.blob)
+
+        partname, desc = self._get_or_add_image(image)
+        rId = rels.get_or_add(partname)
+        pic = CT_Picture.new_ph_pic(sp.shape_id, sp.shape_name, desc, rId)
+        fit = index.fit(image, (area[2], area[3]))
+        pic.blipFill.crop(fit.crop)
+        pic._nvXxPr.nvPr._insert_ph(sp.ph)
+        sp.addprevious(pic)
+        sp.getparent().remove(sp)
+
+        if content.refit:
+            _refit_picture(pic, area, fit, content.center)
+
+    def _get_or_add_image(self, image: Image) -> Tuple[PackURI, str]:
+        if image.sha1 not in self._images:
+            # the first free image number, like `Package.next_image_partname`
+            idx = next(
+                (i + 1 for i, used in enumerate(self._image_idxs) if i + 1 < used),
+                len(self._image_idxs) + 1,
+            )
+            self._image_idxs = sorted(self._image_idxs + [idx])
+            partname = PackURI(f"/ppt/media/image{idx}.{image.ext}")
+            # the picture description, like `ImagePart.desc`
+            desc = image.filename or f"image.{image.ext}"
+            self._images[image.sha1] = (partname, desc)
+            self._content_types[partname] = image.content_type
+            self.media.append((partname.membername, image.blob))
+        return self._images[image.sha1]
+
+    def content_types_xml(
+        self, defaults: Dict[str, str], overrides: Dict[str, str]
+    ) -> bytes:
+        """The content types of the template parts and of the added images, like python-pptx writes them."""
+        defaults, overrides = dict(defaults), dict(overrides)
+        for partname, content_type in self._content_types.items():
+            if (partname.ext.lower(), content_type) in default_content_types:
+                defaults[partname.ext] = content_type
+            else:
+                overrides[partname] = content_type
+        types = CT_Types.new()
+        for ext, content_type in sorted(defaults.items()):
+            types.add_default(ext, content_type)
+        for name, content_type in sorted(overrides.items()):
+            types.add_override(PackURI(name), content_type)
+        return serialize_part_xml(types)
+
+
+class _SlideRels(object):
+    """The relationships of a slide, to which images are added."""
+
+    def __init__(self, partname: PackURI, rels_xml: bytes):
+        self._base_uri = partname.baseURI
+        self._rels = {
+            rel.rId: (rel.reltype, rel.target_ref, rel.targetMode == "External")
+            for rel in parse_xml(rels_xml).relationship_lst
+        }
+
+    def get_or_add(self, partname: PackURI) -> str:
+        """The rId of the image, relating the slide to it if needed, like `_Relationships.get_or_add`."""
+        target_ref = partname.relative_ref(self._base_uri)
+        for rId, rel in self._rels.items():
+            if rel == (RT.IMAGE, target_ref, False):
+                return rId
+        rId = next(
+            f"rId{n}"
+            for n in range(len(self._rels) + 1, 0, -1)
+            if f"rId{n}" not in self._rels
+        )
+        self._rels[rId] = (RT.IMAGE, target_ref, False)
+        return rId
+
+    def xml(self) -> bytes:
+        rels = CT_Relationships.new()
+        for _, rId in sorted(
+            (int(rId[3:]) if rId.startswith("rId") and rId[3:].isdigit() else 0, rId)
+            for rId in self._rels
+        ):
+            rels.add_rel(rId, *self._rels[rId])
+        return rels.xml_file_bytes
+
+
+def _replace_text(sp, text: str):
+    """Set the text of a placeholder, like `replace_text_in_shape`."""
+    if not isinstance(sp, CT_Shape):
+        raise TypeError("shape as no text box")
+    tx_body = sp.get_or_add_txBody()
+    tx_body.clear_content()
+    for p_text in text.split("\n"):
+        tx_body.add_p().append_text(p_text)
@@ -0,0 +1,179 @@
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List
+
+
+class _NullStage(object):
+    """What `Profiler.stage` returns when profiling is off: does nothing, and ignores byte counts."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage(object):
+    __slots__ = ("_profiler", "_name", "_args", "_start", "bytes")
+
+    def __init__(self, profiler: "Profiler", name: str, args: Dict):
+        self._profiler = profiler
+        self._name = name
+        self._args = args
+        self.bytes = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._profiler._record(
+            self._name, self._start, time.perf_counter(), self.bytes, self._args
+        )
+        return False
+
+
+class _Scope(object):
+    def __init__(self, profiler: "Profiler", labels: Dict):
+        self._profiler = profiler
+        self._labels = labels
+
+    def __enter__(self):
+        context = self._profiler._context
+        self._previous = getattr(context, "labels", {})
+        context.labels = {**self._previous, **self._labels}
+        return self
+
+    def __exit__(self, *exc):
+        self._profiler._context.labels = self._previous
+        return False
+
+
+class Profiler(object):
+    """
+    Collects the duration (and optionally the byte count) of the deck generation stages.
+
+    It is off by default, in which case `stage` and `scope` return a shared no-op context manager, so the
+    instrumentation can stay in the code at virtually no cost. When on, each stage costs two clock reads and a list
+    append, cheap enough for production runs.
+
+    Events are labelled with the deck and slide they belong to through `scope`, and can be summarised per stage or
+    written as a trace in the Chrome trace event format (viewable in chrome://tracing or https://ui.perfetto.dev).
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._events: List[Dict] = []
+        self._lock = threading.Lock()
+        self._context = threading.local()
+
+    def enable(self):
+        self.enabled = True
+
+    def stage(self, name: str, **args):
+        """
+        Time the enclosed block. Set `bytes` on the returned object to record a byte count.
+        """
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name, args)
+
+    def scope(self, **labels):
+        """Label all the stages timed in the enclosed block (e.g. `deck=...`, `slide=...`)."""
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Scope(self, labels)
+
+    def _record(self, name: str, start: float, end: float, n_bytes, args: Dict):
+        event = {
+            "name": name,
+            "start": start,
+            "duration": end - start,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            **getattr(self._context, "labels", {}),
+            **args,
+        }
+        if n_bytes is not None:
+            event["bytes"] = n_bytes
+        with self._lock:
+            self._events.append(event)
+
+    def drain(self) -> List[Dict]:
+        """Remove and return the recorded events, e.g. to send them from a worker process to the main one."""
+        with self._lock:
+            events, self._events = self._events, []
+        return events
+
+    def extend(self, events: List[Dict]):
+        """Add events recorded elsewhere (e.g. in a worker process)."""
+        with self._lock:
+            self._events.extend(events)
+
+    def summary(self) -> str:
+        """A table of the time and bytes spent per stage."""
+        with self._lock:
+            events = list(self._events)
+        stats = defaultdict(lambda: {"calls": 0, "total": 0.0, "max": 0.0, "bytes": 0})
+        decks = set()
+        for event in events:
+            stat = stats[event["name"]]
+            stat["calls"] += 1
+            stat["total"] += event["duration"]
+            stat["max"] = max(stat["max"], event["duration"])
+            stat["bytes"] += event.get("bytes", 0)
+            if "deck" in event:
+                decks.add((event["pid"], event["deck"]))
+
+        lines = [
+            f"[+] Profile ({len(decks)} deck(s), {len(events)} events):",
+            f"    {'stage':<22}{'calls':>8}{'total (s)':>12}{'mean (ms)':>12}{'max (ms)':>12}{'bytes':>14}",
+        ]
+        for name, stat in sorted(stats.items(), key=lambda kv: -kv[1]["total"]):
+            lines.append(
+                f"    {name:<22}{stat['calls']:>8}{stat['total']:>12.3f}"
+                f"{1000 * stat['total'] / stat['calls']:>12.2f}{1000 * stat['max']:>12.2f}"
+                f"{stat['bytes'] or '':>14}"
+            )
+        return "\n".join(lines)
+
+    def write_trace(self, trace_path: Path):
+        """Write all the events as a Chrome trace event JSON file."""
+        with self._lock:
+            events = list(self._events)
+        origin = min((e["start"] for e in events), default=0.0)
+        trace = {
+            "traceEvents": [
+                {
+                    "name": e["name"],
+                    "ph": "X",
+                    "ts": round((e["start"] - origin) * 1e6, 1),
+                    "dur": round(e["duration"] * 1e6, 1),
+                    "pid": e["pid"],
+                    "tid": e["tid"],
+                    "args": {
+                        k: v
+                        for k, v in e.items()
+                        if k not in ("name", "start", "duration", "pid", "tid")
+                    },
+                }
+                for e in events
+            ],
+            "displayTimeUnit": "ms",
+        }
+        Path(trace_path).parent.mkdir(parents=True, exist_ok=True)
+        with open(trace_path, "w") as stream:
+            json.dump(trace, stream)
+
+
+PROFILER = Profiler()
@@ -0,0 +1,110 @@
+import datetime
+import io
+import os
+import struct
+import zipfile
+from typing import Optional, Tuple
+
+# the standard way of fixing the date of a build, see https://reproducible-builds.org/specs/source-date-epoch/
+SOURCE_DATE_EPOCH = "SOURCE_DATE_EPOCH"
+
+CONTENT_TYPES_NAME = "[Content_Types].xml"
+
+# the earliest date a zip entry can hold
+_ZIP_EPOCH = datetime.datetime(1980, 1, 1)
+
+
+class BuildClock(object):
+    """
+    The date stamped in the outputs: title pages, file names and archive entries.
+
+    By default, it is the current date. Once a build date is fixed, outputs are reproducible: they use that date, and
+    the metadata of the decks and bundles are normalised (see `normalize_zip`), so that identical inputs give
+    identical bytes.
+    """
+
+    def __init__(self):
+        self.build_date: Optional[datetime.datetime] = None
+
+    def configure(self, build_date: Optional[datetime.datetime]):
+        self.build_date = build_date
+
+    @staticmethod
+    def date_from_environment() -> Optional[datetime.datetime]:
+        """The build date set by the `SOURCE_DATE_EPOCH` environment variable (in UTC), if any."""
+        epoch = os.environ.get(SOURCE_DATE_EPOCH)
+        if not epoch:
+            return None
+        try:
+            return datetime.datetime.fromtimestamp(
+                int(epoch), tz=datetime.timezone.utc
+            ).replace(tzinfo=None)
+        except ValueError:
+            raise ValueError(
+                f"{SOURCE_DATE_EPOCH} must be a number of seconds, got '{epoch}'"
+            )
+
+    @property
+    def reproducible(self) -> bool:
+        return self.build_date is not None
+
+    def now(self) -> datetime.datetime:
+        return (
+            self.build_date if self.build_date is not None else datetime.datetime.now()
+        )
+
+    def zip_date_time(self) -> Tuple[int, int, int, int, int, int]:
+        """The date of the entries of the archives, in the format of `zipfile.ZipInfo.date_time`."""
+        return max(self.now(), _ZIP_EPOCH).timetuple()[:6]
+
+
+BUILD_CLOCK = BuildClock()
+
+
+def zip_entry(
+    name: str, date_time: Tuple[int, int, int, int, int, int]
+) -> zipfile.ZipInfo:
+    """A zip entry whose metadata only depend on its name and date (not on the platform or the current time)."""
+    entry = zipfile.ZipInfo(name, date_time)
+    entry.create_system = 3
+    entry.external_attr = 0o600 << 16
+    return entry
+
+
+def normalize_zip(
+    content: bytes, date_time: Tuple[int, int, int, int, int, int]
+) -> bytes:
+    """
+    Rewrite a zip archive (e.g. a .pptx file) with normalised metadata: `[Content_Types].xml` first then the other
+    entries by name, the same date for every entry and no platform dependent attributes.
+
+    The compressed data of the entries are copied as they are, so this costs no compression.
+    """
+    output = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(content)) as source, zipfile.ZipFile(
+        output, "w"
+    ) as target:
+        for info in sorted(
+            source.infolist(),
+            key=lambda i: (i.filename != CONTENT_TYPES_NAME, i.filename),
+        ):
+            # the data follows the local header, whose name and extra field lengths may differ from the central
+            # directory ones
+            name_length, extra_length = struct.unpack(
+                "<HH", content[info.header_offset + 26 : info.header_offset + 30]
+            )
+            start = info.header_offset + 30 + name_length + extra_length
+
+            entry = zip_entry(info.filename, date_time)
+            entry.compress_type = info.compress_type
+            entry.CRC = info.CRC
+            entry.compress_size = info.compress_size
+            entry.file_size = info.file_size
+            entry.header_offset = target.fp.tell()
+            # zipfile has no public API to add already compressed data
+            target.fp.write(entry.FileHeader())
+            target.fp.write(content[start : start + info.compress_size])
+            target.filelist.append(entry)
+            target.NameToInfo[entry.filename] = entry
+            target.start_dir = target.fp.tell()
+    return output.getvalue()
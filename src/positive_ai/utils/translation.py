@@ -0,0 +1,213 @@
+import abc
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from positive_ai.constants import CACHE_DIR
+
+LANGUAGE_PAIRS = (("fr", "en"), ("en", "fr"))
+
+
+class TranslationBackend(abc.ABC):
+    """
+    A service translating texts. Implementations receive whole batches so that they can minimise round trips.
+    """
+
+    # whether the translations are worth keeping in the persistent cache
+    cacheable = True
+
+    @abc.abstractmethod
+    def translate_batch(self, texts: List[str], src: str, dest: str) -> List[str]:
+        """
+        Args:
+            texts: the texts to translate
+            src: the language of the texts
+            dest: the language to translate to
+
+        Returns:
+            translations: the translated texts, in the same order
+        """
+        pass
+
+
+class GoogleTranslateBackend(TranslationBackend):
+    """Translation through Google Translate (requires the optional `googletrans` package and network access)."""
+
+    def translate_batch(self, texts: List[str], src: str, dest: str) -> List[str]:
+        try:
+            from googletrans import Translator
+        except ImportError:
+            raise ImportError(
+                "The google translation backend requires googletrans: pip install googletrans"
+            )
+
+        translated = Translator().translate(texts, src=src, dest=dest)
+        # googletrans >= 4.0 is asynchronous
+        if asyncio.iscoroutine(translated):
+            translated = asyncio.run(translated)
+        return [t.text for t in translated]
+
+
+class DictionaryBackend(TranslationBackend):
+    """
+    Translation from a local glossary, e.g. to review translations by hand or to stub the network service in tests.
+
+    Texts missing from the glossary are left untranslated. Being local, its translations are not cached, so edits to
+    the glossary are picked up immediately.
+    """
+
+    cacheable = False
+
+    def __init__(self, translations: Dict[str, str]):
+        self._log = logging.getLogger(__name__)
+        self._translations = translations
+
+    @classmethod
+    def from_file(cls, glossary_path: Path) -> "DictionaryBackend":
+        """Load a glossary from a YAML or JSON mapping of source text to translated text."""
+        from positive_ai.utils.io import read_yaml
+
+        return cls(read_yaml(str(glossary_path)) or {})
+
+    def translate_batch(self, texts: List[str], src: str, dest: str) -> List[str]:
+        missing = [t for t in texts if t not in self._translations]
+        if missing:
+            self._log.warning(f"{len(missing)} text(s) missing from the glossary")
+        return [self._translations.get(t, t) for t in texts]
+
+
+TRANSLATION_BACKENDS = {"google": GoogleTranslateBackend}
+
+
+def get_backend(name_or_path: str) -> TranslationBackend:
+    """Get a registered backend by name, or a dictionary backend if given the path to a glossary file."""
+    if name_or_path in TRANSLATION_BACKENDS:
+        return TRANSLATION_BACKENDS[name_or_path]()
+    if Path(name_or_path).is_file():
+        return DictionaryBackend.from_file(Path(name_or_path))
+    raise ValueError(
+        f"Unknown translation backend '{name_or_path}'. Use one of {list(TRANSLATION_BACKENDS)} or a glossary file."
+    )
+
+
+class TranslationCache(object):
+    """
+    A persistent cache of translations, keyed by language pair and hash of the source text.
+    """
+
+    def __init__(self, cache_path: Path = CACHE_DIR / "translations.json"):
+        self._path = Path(cache_path)
+        self._lock = threading.Lock()
+        self._entries: Dict[str, str] = {}
+        if self._path.exists():
+            with open(self._path) as stream:
+                self._entries = json.load(stream)
+
+    @staticmethod
+    def _key(text: str, src: str, dest: str) -> str:
+        return f"{src}:{dest}:{hashlib.sha256(text.encode()).hexdigest()}"
+
+    def get(self, text: str, src: str, dest: str) -> Optional[str]:
+        with self._lock:
+            return self._entries.get(self._key(text, src, dest))
+
+    def set(self, text: str, src: str, dest: str, translation: str):
+        with self._lock:
+            self._entries[self._key(text, src, dest)] = translation
+
+    def save(self):
+        """Write the cache atomically."""
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self._path.with_name(f"{self._path.name}.{os.getpid()}.tmp")
+        with self._lock:
+            with open(tmp, "w") as stream:
+                json.dump(self._entries, stream)
+        os.replace(tmp, self._path)
+
+
+class Translator(object):
+    """
+    Translates texts in batches, only asking the backend for the texts missing from the cache.
+    """
+
+    def __init__(
+        self,
+        backend: TranslationBackend,
+        cache: TranslationCache = None,
+        batch_size: int = None,
+    ):
+        self._log = logging.getLogger(__name__)
+        self._backend = backend
+        self._cache = cache if cache is not None else TranslationCache()
+        # None means a single batch, however many texts there are
+        self._batch_size = batch_size
+
+    def translate_all(
+        self, texts: Iterable[str], src: str, dest: str
+    ) -> Dict[str, str]:
+        """
+        Returns:
+            translations: a mapping from each of the given texts to its translation
+        """
+        use_cache = self._backend.cacheable
+        translations, missing = {}, []
+        for text in dict.fromkeys(texts):
+            cached = self._cache.get(text, src, dest) if use_cache else None
+            if cached is None:
+                missing.append(text)
+            else:
+                translations[text] = cached
+
+        if missing:
+            size = self._batch_size or len(missing)
+            for start in range(0, len(missing), size):
+                batch = missing[start : start + size]
+                for text, translation in zip(
+                    batch, self._backend.translate_batch(batch, src=src, dest=dest)
+                ):
+                    translations[text] = translation
+                    if use_cache:
+                        self._cache.set(text, src, dest, translation)
+            if use_cache:
+                self._cache.save()
+        self._log.info(
+            f"{src}->{dest}: {len(translations) - len(missing)} cached, {len(missing)} translated"
+        )
+        return translations
+
+
+def fill_missing_translations(records: Sequence, translator: Translator) -> List:
+    """
+    Fill the empty french / english fields of the records from their counterpart in the other language.
+
+    The fields to fill are declared by the record model in `TRANSLATED_FIELDS`, as (french field, english field)
+    pairs. All the texts of the roster are translated in one batch per language pair.
+
+    Returns:
+        records: copies of the records, with the translations filled in
+    """
+    records = list(records)
+    updates = [{} for _ in records]
+    for src, dest in LANGUAGE_PAIRS:
+        # (record index, field to fill, text to translate)
+        todo = []
+        for index, record in enumerate(records):
+            for fr_field, en_field in record.TRANSLATED_FIELDS:
+                fields = {"fr": fr_field, "en": en_field}
+                text = getattr(record, fields[src])
+                if text and not getattr(record, fields[dest]):
+                    todo.append((index, fields[dest], text))
+        if todo:
+            translations = translator.translate_all([t for _, _, t in todo], src, dest)
+            for index, field, text in todo:
+                updates[index][field] = translations[text]
+
+    return [
+        record.model_copy(update=update) if update else record
+        for record, update in zip(records, updates)
+    ]
@@ -0,0 +1,213 @@
+import hashlib
+import json
+import os
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Type, Union
+
+from positive_ai import __version__
+from positive_ai.constants import CACHE_DIR
+from positive_ai.utils.io import iter_numbered_records
+from positive_ai.utils.manifest import hash_file
+
+VALIDATION_CACHE_DIR = CACHE_DIR / "validation"
+
+
+@dataclass(frozen=True)
+class RecordError:
+    """An error in a record of a roster file."""
+
+    line_number: int
+    field: str
+    message: str
+
+
+class RosterValidationError(ValueError):
+    """All the errors of a roster file, reported at once."""
+
+    def __init__(self, source: Union[str, Path], errors: List[RecordError]):
+        self.source = str(source)
+        self.errors = errors
+        super().__init__(
+            "\n".join(
+                [f"{len(errors)} error(s) in {self.source}:"]
+                + [
+                    f"    {self.source}:{e.line_number}: {e.field}: {e.message}"
+                    for e in errors
+                ]
+            )
+        )
+
+
+class RosterValidator(object):
+    """
+    Validates the records of a whole roster file against a pydantic model, in a single pass through a type adapter.
+
+    Every error is collected with the line number of its record, instead of stopping at the first invalid record, and
+    the images the records point to (fields ending with "_path") are checked up front, before any generation starts.
+
+    Records that already validated are not validated again (which spares e.g. the email checks): the validated values
+    of the records of each roster file are kept in a cache, keyed by the content of the records and the schema of the
+    model. When the file itself did not change, it is not even parsed again. Use `RosterValidator.for_model` to share
+    the (costly to build) type adapter.
+    """
+
+    def __init__(self, model: Type, cache_dir: Optional[Path] = VALIDATION_CACHE_DIR):
+        from pydantic import VERSION, TypeAdapter
+
+        self.model = model
+        self._adapter = TypeAdapter(List[model])
+        self._image_fields = [f for f in model.model_fields if f.endswith("_path")]
+        schema = json.dumps(model.model_json_schema(), sort_keys=True)
+        self._fingerprint = hashlib.sha256(
+            f"{__version__}\n{VERSION}\n{schema}".encode()
+        ).hexdigest()[:16]
+        self._cache_dir = (
+            Path(cache_dir) / f"{model.__name__}-{self._fingerprint}"
+            if cache_dir is not None
+            else None
+        )
+
+    @classmethod
+    def for_model(cls, model: Type) -> "RosterValidator":
+        """The validator of a model, created on first use."""
+        with _VALIDATORS_LOCK:
+            validator = _VALIDATORS.get(model)
+            if validator is None:
+                validator = _VALIDATORS[model] = cls(model)
+        return validator
+
+    def validate_file(self, config_file_path: Union[str, Path]) -> List:
+        """
+        Args:
+            config_file_path: a roster file, in any layout `iter_records` reads
+
+        Returns:
+            records: the validated records, in the order of the file
+
+        Raises:
+            RosterValidationError: listing every invalid record and unreadable image of the file
+        """
+        from pydantic import ValidationError
+
+        cache_path = self._cache_path(config_file_path)
+        cache = self._load_cache(cache_path)
+        source_digest = hash_file(config_file_path)
+        if cache.get("source") == source_digest:
+            # fast path: the file did not change, only its images are checked again
+            numbered = [
+                (line_number, values) for line_number, _, values in cache["records"]
+            ]
+            self._check_images(config_file_path, numbered, [])
+            return [self.model.model_construct(**values) for _, values in numbered]
+
+        numbered = list(iter_numbered_records(config_file_path))
+        keys = [_record_key(record) for _, record in numbered]
+        cache = {key: values for _, key, values in cache.get("records", [])}
+
+        records = [
+            self.model.model_construct(**cache[key]) if key in cache else None
+            for key in keys
+        ]
+        fresh = [i for i, record in enumerate(records) if record is None]
+        errors: List[RecordError] = []
+        if fresh:
+            try:
+                validated = self._adapter.validate_python(
+                    [numbered[i][1] for i in fresh]
+                )
+            except ValidationError as e:
+                for error in e.errors():
+                    position, *location = error["loc"]
+                    errors.append(
+                        RecordError(
+                            numbered[fresh[position]][0],
+                            ".".join(str(part) for part in location) or "<record>",
+                            error["msg"],
+                        )
+                    )
+            else:
+                for i, record in zip(fresh, validated):
+                    records[i] = record
+
+        self._check_images(config_file_path, numbered, errors)
+        self._save_cache(
+            cache_path,
+            {
+                "source": source_digest,
+                "records": [
+                    (
+                        line_number,
+                        key,
+                        record.model_dump(mode="json", exclude_unset=True),
+                    )
+                    for (line_number, _), key, record in zip(numbered, keys, records)
+                ],
+            },
+        )
+        return records
+
+    def _check_images(
+        self,
+        config_file_path,
+        numbered: List[Tuple[int, Dict]],
+        errors: List[RecordError],
+    ):
+        """Check the images of the records, then raise all the errors, if any."""
+        # the images are checked on every run: they may have moved since the records were cached
+        for line_number, record in numbered:
+            for field in self._image_fields:
+                path = record.get(field)
+                if isinstance(path, str) and path and not _readable(path):
+                    errors.append(
+                        RecordError(
+                            line_number, field, f"cannot read the image at '{path}'"
+                        )
+                    )
+        if errors:
+            errors.sort(key=lambda e: e.line_number)
+            raise RosterValidationError(config_file_path, errors)
+
+    def _cache_path(self, config_file_path: Union[str, Path]) -> Optional[Path]:
+        # one cache file per roster file, holding the records of its last validation
+        if self._cache_dir is None:
+            return None
+        source = str(Path(config_file_path).resolve())
+        return self._cache_dir / f"{hashlib.sha1(source.encode()).hexdigest()}.json"
+
+    @staticmethod
+    def _load_cache(cache_path: Optional[Path]) -> Dict:
+        if cache_path is None or not cache_path.exists():
+            return {}
+        try:
+            with open(cache_path) as stream:
+                return json.load(stream)
+        except ValueError:
+            # a corrupted cache only costs a full validation
+            return {}
+
+    @staticmethod
+    def _save_cache(cache_path: Optional[Path], content: Dict):
+        """Write the cache atomically."""
+        if cache_path is None:
+            return
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+        with open(tmp, "w") as stream:
+            json.dump(content, stream)
+        os.replace(tmp, cache_path)
+
+
+_VALIDATORS: Dict[Type, RosterValidator] = {}
+_VALIDATORS_LOCK = threading.Lock()
+
+
+def _record_key(record: Dict) -> str:
+    return hashlib.sha256(
+        json.dumps(record, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+def _readable(path: str) -> bool:
+    return os.path.isfile(path) and os.access(path, os.R_OK)
@@ -0,0 +1,31 @@
+import pytest
+from PIL import Image
+
+from positive_ai.utils.images import EMU_PER_INCH, ImagePreprocessor
+
+
+@pytest.fixture
+def preprocessor(tmp_path):
+    return ImagePreprocessor(cache_dir=tmp_path / "cache", dpi=100)
+
+
+@pytest.fixture
+def cmyk_tiff(tmp_path):
+    path = tmp_path / "logo.tif"
+    Image.new("CMYK", (400, 200), (0, 128, 255, 0)).save(path)
+    return path
+
+
+@pytest.mark.parametrize(
+    "width_inches, expected_size", [(1, (200, 100)), (8, (400, 200))]
+)
+def test_prepare_cmyk_tiff(preprocessor, cmyk_tiff, width_inches, expected_size):
+    # a 2:1 placeholder, smaller (the image is scaled down) or larger (only converted) than the image
+    prepared = preprocessor.prepare(
+        cmyk_tiff, 2 * width_inches * EMU_PER_INCH, width_inches * EMU_PER_INCH
+    )
+
+    with Image.open(prepared) as image:
+        assert image.format == "PNG"
+        assert image.mode == "RGB"
+        assert image.size == expected_size